@@ -1,26 +1,161 @@
+import copy
+import json
+import os
+import queue
+import threading
+import time
+
 import gradio as gr
-from transformers import AutoModelForCausalLM, PreTrainedTokenizerFast
+import torch
+from transformers import AutoModelForCausalLM, DynamicCache, PreTrainedTokenizerFast
+from transformers.generation.streamers import BaseStreamer
+from transformers.pytorch_utils import Conv1D
+from tokenizers import normalizers, decoders
 from indic_unicode_mapper import IndicUnicodeMapper
+from incremental_decoder import IncrementalDecoder
 
 MODEL_DIR = "tamil-lyrics-model"
+PROMPT_PREFIX = "பாடல் தலைப்பு: "
+# the requests queued within the wait are generated together, up to the batch size.
+MAX_BATCH = int(os.environ.get("LYRICS_MAX_BATCH", "8"))
+MAX_WAIT_MS = float(os.environ.get("LYRICS_MAX_WAIT_MS", "50"))
+# dynamic int8 quantization of the model, for the CPU inference.
+QUANTIZE_INT8 = os.environ.get("LYRICS_INT8", "0").lower() in ("1", "true", "yes")
 
 tokenizer = PreTrainedTokenizerFast.from_pretrained(MODEL_DIR)
 mapper = IndicUnicodeMapper()
+# the text is mapped by the Python mapper, so a tokenizer saved with the mapping embedded (see to_tokenizer)
+# gets the plain BERT normalizer and WordPiece decoder back, instead of running its mapping passes for nothing.
+if (json.loads(tokenizer.backend_tokenizer.to_str()).get("normalizer") or {}).get("type") == "Sequence":
+    tokenizer.backend_tokenizer.normalizer = normalizers.BertNormalizer(clean_text=False, handle_chinese_chars=True,
+                                                                        strip_accents=False, lowercase=False)
+    tokenizer.backend_tokenizer.decoder = decoders.WordPiece()
 model = AutoModelForCausalLM.from_pretrained(MODEL_DIR)
+model.eval()
+
+# GPT-2 keeps its projections in Conv1D modules, which the dynamic quantization does not touch,
+# so they are turned into the equivalent Linear modules first.
+def _conv1d_to_linear(module: torch.nn.Module):
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            (n_in, n_out) = child.weight.shape
+            linear = torch.nn.Linear(n_in, n_out)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+
+if QUANTIZE_INT8:
+    _conv1d_to_linear(model)
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+# the prompt is [cls] + prefix + theme + [sep], and the prefix ends in a word boundary,
+# so its tokens are the same in every prompt and its key/values are computed once.
+prefix_ids = [tokenizer.cls_token_id] + tokenizer(mapper.encode(PROMPT_PREFIX), add_special_tokens=False).input_ids
+with torch.no_grad():
+    prefix_cache = model(torch.tensor([prefix_ids]), past_key_values=DynamicCache(), use_cache=True).past_key_values
+pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+class _BatchStreamer(BaseStreamer):
+    """
+    Hand over the token ids generated for each row of a batch to the queue of its request, as they arrive.
+    """
+    def __init__(self, queues: list[queue.Queue]):
+        self.queues = queues
+        self.prompt = True
+
+    def put(self, value):
+        # the first call brings the prompts, which the requests already have.
+        if self.prompt:
+            self.prompt = False
+            return
+        for q, token_ids in zip(self.queues, value.view(len(self.queues), -1).tolist()):
+            for token_id in token_ids:
+                q.put(token_id)
+
+    def end(self):
+        pass
+
+def _prompt_ids(theme: str) -> list[int]:
+    return tokenizer(mapper.encode(f"{theme}\n"), add_special_tokens=False).input_ids + [tokenizer.sep_token_id]
+
+def _generate_batch(themes: list[str], queues: list[queue.Queue]):
+    suffixes = [_prompt_ids(theme) for theme in themes]
+    longest = max(len(suffix) for suffix in suffixes)
+    # the padding goes between the prefix and the theme, so that all the prompts share the prefix
+    # key/values and end on their last token; the positions skip the padding through the mask.
+    input_ids = torch.tensor([prefix_ids + [pad_token_id] * (longest - len(suffix)) + suffix for suffix in suffixes])
+    attention_mask = torch.tensor([[1] * len(prefix_ids) + [0] * (longest - len(suffix)) + [1] * len(suffix) for suffix in suffixes])
+    # generate extends the cache in place, so each batch gets its own copy.
+    cache = copy.deepcopy(prefix_cache)
+    cache.batch_repeat_interleave(len(themes))
+    with torch.no_grad():
+        model.generate(
+            input_ids,
+            streamer=_BatchStreamer(queues),
+            attention_mask=attention_mask,
+            past_key_values=cache,
+            max_new_tokens=300,
+            do_sample=True,
+            temperature=0.8,
+            top_p=0.95,
+            pad_token_id=pad_token_id,
+        )
+
+class GenerationScheduler:
+    """
+    Queue the generation requests of the concurrent users and run them as padded batches.
+    The token ids generated for a request are streamed to its queue, ending with None (or the exception).
+    """
+    def __init__(self, max_batch: int = MAX_BATCH, max_wait: float = MAX_WAIT_MS / 1000):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, theme: str) -> queue.Queue:
+        ids = queue.Queue()
+        self._queue.put((theme, ids))
+        return ids
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                # wait for the batch to fill up, the first request never waits longer than max_wait.
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                pass
+            try:
+                _generate_batch([theme for theme, _ in batch], [ids for _, ids in batch])
+                end = None
+            except Exception as e:
+                end = e
+            for _, ids in batch:
+                ids.put(end)
+
+scheduler = GenerationScheduler()
+
+# the special tokens (the padding of the finished rows included) are dropped from the output.
+skip_ids = tokenizer.all_special_ids
 
-def generate_lyrics(theme: str) -> str:
-    prompt = f"பாடல் தலைப்பு: {theme}\n"
-    mapped = mapper.encode(prompt)
-    input_ids = tokenizer(mapped, return_tensors="pt").input_ids
-    output_ids = model.generate(
-        input_ids,
-        max_new_tokens=300,
-        do_sample=True,
-        temperature=0.8,
-        top_p=0.95,
-    )
-    raw = tokenizer.decode(output_ids[0], skip_special_tokens=True)
-    return mapper.decode(raw)
+def generate_lyrics(theme: str):
+    ids = scheduler.submit(theme)
+    # the output starts with the prompt, and then grows by the new text of each generated token.
+    decoder = IncrementalDecoder(tokenizer.backend_tokenizer, mapper, skip_ids)
+    lyrics = decoder.step(prefix_ids + _prompt_ids(theme))
+    yield lyrics
+    while (token_id := ids.get()) is not None:
+        if isinstance(token_id, Exception):
+            raise token_id
+        text = decoder.step([token_id])
+        if text:
+            lyrics += text
+            yield lyrics
+    yield lyrics + decoder.flush()
 
 iface = gr.Interface(
     fn=generate_lyrics,
@@ -31,4 +166,5 @@ iface = gr.Interface(
 )
 
 if __name__ == "__main__":
-    iface.launch()
+    # let as many requests in as there are places in a batch.
+    iface.queue(default_concurrency_limit=MAX_BATCH).launch()
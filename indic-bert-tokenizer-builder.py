@@ -5,12 +5,16 @@ import os.path
 from logger import get_logger
 
 if len(sys.argv) < 4:
-    print("requires <folder|file> <vsize> <outbase>")
+    print("requires <folder|file> <vsize[,vsize...]> <outbase> [cache-dir]")
     sys.exit(0)
 
 _path = sys.argv[1]
-_vsize =int(sys.argv[2])
+# a comma separated list of sizes sweeps them all in a single build, into <outbase>/vocab-<size>.
+_vsizes = [int(v) for v in sys.argv[2].split(",")]
+_vsize = _vsizes[0] if len(_vsizes) == 1 else _vsizes
 _outbase = sys.argv[3]
+# the mapped shards are kept here across the builds, if given.
+_cache_dir = sys.argv[4] if len(sys.argv) > 4 else None
 
 logger = get_logger("indic-bert-tokenizer-builder")
 
@@ -40,9 +44,17 @@ if len(files) <= 0:
     sys.exit(0)
 
 from indic_bert_tokenizer import IndicBertWordPieceTokenizer
-tok = IndicBertWordPieceTokenizer.build_model(files, vocab_size=_vsize, model_dir=_outbase, human_readable=True)
+tok = IndicBertWordPieceTokenizer.build_model(files, vocab_size=_vsize, model_dir=_outbase, human_readable=True,
+                                              cache_dir=_cache_dir)
+
+_sample = "தமிழ் மொழி ஒரு இனிய மொழி. മലയാളം ഭാഷയും இனிய ഭാഷ."
+if isinstance(tok, dict):
+    for size, size_tok in tok.items():
+        toks = size_tok.encode(_sample, lang="auto")
+        print(f"vocab size {size}: {len(toks.ids)} tokens", [size_tok.decode_string(token) for token in toks.tokens])
+    sys.exit(0)
 
-toks = tok.encode("தமிழ் மொழி ஒரு இனிய மொழி. മലയാളം ഭാഷയും இனிய ഭാഷ.")
+toks = tok.encode(_sample, lang="auto")
 print(toks.ids)
 print(toks.tokens)
-print([tok.decode_string(tok) for tok in toks.tokens])
+print([tok.decode_string(token) for token in toks.tokens])
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+# the count phase of the two-phase build: count the words of a share of the corpus into a word count file.
+# run it once per share, on as many machines as there are shares, and merge the files with indic-bert-tokenizer-merger.py.
+
+import sys
+import os.path
+from logger import get_logger
+
+if len(sys.argv) < 3:
+    print("requires <folder|file> <counts-file> [shard-index] [num-shards]")
+    sys.exit(0)
+
+_path = sys.argv[1]
+_counts = sys.argv[2]
+_shard_index = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+_num_shards = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+
+logger = get_logger("indic-bert-tokenizer-counter")
+
+# check if the file exists
+if not os.path.exists(_path):
+    logger.error(f"{_path=} does not exist!")
+    sys.exit(0)
+
+import os
+from glob import glob
+
+# collect the input data file paths.
+# we use only the *.txt files if a folder is presented, in the same order on every machine.
+files = []
+if os.path.isdir(_path):
+    files = sorted(y for x in os.walk(_path) for y in glob(os.path.join(x[0], '*.txt')))
+elif os.path.isfile(_path):
+    files.append(_path)
+else:
+    logger.error(f"{_path=} is not a valid file or directory.")
+    sys.exit(0)
+
+# sanity check.
+if len(files) <= 0:
+    logger.error("no valid input data files to process.")
+    sys.exit(0)
+
+from indic_bert_tokenizer import IndicBertWordPieceTokenizer
+summary = IndicBertWordPieceTokenizer.count_words(files, _counts, shard_index=_shard_index, num_shards=_num_shards)
+print(summary)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+# the merge phase of the two-phase build: train the vocabulary from the word count files of all the shares.
+
+import sys
+import os.path
+from logger import get_logger
+
+if len(sys.argv) < 4:
+    print("requires <vsize> <outbase> <counts-file>...")
+    sys.exit(0)
+
+_vsize = int(sys.argv[1])
+_outbase = sys.argv[2]
+_counts = sys.argv[3:]
+
+logger = get_logger("indic-bert-tokenizer-merger")
+
+# check if the files exist
+missing = [path for path in _counts if not os.path.isfile(path)]
+if missing:
+    logger.error(f"{missing=} do not exist!")
+    sys.exit(0)
+
+from indic_bert_tokenizer import IndicBertWordPieceTokenizer
+tok = IndicBertWordPieceTokenizer.build_model_from_counts(_counts, vocab_size=_vsize, model_dir=_outbase, human_readable=True)
+
+toks = tok.encode("தமிழ் மொழி ஒரு இனிய மொழி. മലയാളം ഭാഷയും இனிய ഭാഷ.", lang="auto")
+print(toks.ids)
+print(toks.tokens)
+print([tok.decode_string(token) for token in toks.tokens])
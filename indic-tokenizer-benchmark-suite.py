@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+# benchmark suite of the mapper and the tokenizer on a synthetic corpus, with JSON baselines.
+# every case reports a rate (higher is better), and a case slower than the baseline by more than the
+# threshold fails the run, so that the releases can be checked for the performance regressions.
+# usage: indic-tokenizer-benchmark-suite.py [--size MB] [--mix ta=0.5,ml=0.3,en=0.2] [--baseline file.json]
+#                                           [--save-baseline file.json] [--threshold 0.2] [--repeat 3]
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, _root)
+
+from synthetic_corpus import generate_lines, parse_mix, DEFAULT_MIX
+
+# time the function, the best of the repeats, returning the seconds and its last result.
+def best_of(repeat:int, func):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+# import and first construction times, in a fresh interpreter so that nothing is cached yet.
+_cold_start = """
+import json, sys, time
+start = time.perf_counter()
+from indic_unicode_mapper import IndicUnicodeMapper
+from indic_bert_tokenizer import IndicBertWordPieceTokenizer
+imported = time.perf_counter()
+IndicUnicodeMapper().encode("")
+mapper = time.perf_counter()
+IndicBertWordPieceTokenizer(sys.argv[1]).encode("")
+tokenizer = time.perf_counter()
+print(json.dumps({"import": imported - start, "mapper": mapper - imported, "tokenizer": tokenizer - mapper}))
+"""
+
+def cold_start(model_path:str, workdir:str) -> dict:
+    env = dict(os.environ, PYTHONPATH=_root + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    output = subprocess.run([sys.executable, "-c", _cold_start, model_path], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def run_suite(lines:list[str], repeat:int, workdir:str) -> dict:
+    from indic_unicode_mapper import IndicUnicodeMapper
+    from indic_bert_tokenizer import IndicBertWordPieceTokenizer
+
+    results = {}
+    def record(case:str, seconds:float, amount:float, unit:str):
+        results[case] = {"rate": amount / seconds, "unit": unit, "seconds": seconds}
+        print(f"{case:>28}: {amount / seconds:14.1f} {unit:<10} ({seconds:.3f} s)")
+
+    text = "".join(lines)
+    chars = len(text)
+    mapper = IndicUnicodeMapper()
+    mapper.encode("", lang="auto")
+
+    seconds, mapped = best_of(repeat, lambda: mapper.encode(text, lang="auto"))
+    record("mapper.encode", seconds, chars, "chars/s")
+    seconds, _ = best_of(repeat, lambda: mapper.decode(mapped))
+    record("mapper.decode", seconds, len(mapped), "chars/s")
+    # the mapped text has no orphaned vowels, so is_consistent scans all of it.
+    seconds, _ = best_of(repeat, lambda: mapper.is_consistent(mapped, lang="auto"))
+    record("mapper.is_consistent", seconds, len(mapped), "chars/s")
+
+    # build the model on a part of the corpus, a couple of MB at most.
+    corpus = os.path.join(workdir, "corpus.txt")
+    with open(corpus, "w") as fw:
+        fw.writelines(lines[:max(1, len(lines) * 2 * 1024 * 1024 // max(len(text.encode("utf-8")), 1))])
+        fw.close()
+    size = os.path.getsize(corpus)
+    model_dir = os.path.join(workdir, "model")
+    os.makedirs(model_dir, exist_ok=True)
+    seconds, _ = best_of(1, lambda: IndicBertWordPieceTokenizer.build_model([corpus], model_dir=model_dir, vocab_size=4000))
+    record("tokenizer.build_model", seconds, size / 1024 / 1024, "MB/s")
+    model_path = os.path.join(model_dir, "indic-bert-tokenizer-vocab.txt")
+
+    tokenizer = IndicBertWordPieceTokenizer(model_path)
+    seconds, encodings = best_of(repeat, lambda: [tokenizer.encode(line, lang="auto") for line in lines])
+    record("tokenizer.encode", seconds, chars, "chars/s")
+    seconds, _ = best_of(repeat, lambda: tokenizer.encode_batch(lines, lang="auto"))
+    record("tokenizer.encode_batch", seconds, chars, "chars/s")
+    sequences = [encoding.ids for encoding in encodings]
+    tokens = sum(len(ids) for ids in sequences)
+    seconds, _ = best_of(repeat, lambda: [tokenizer.decode(ids) for ids in sequences])
+    record("tokenizer.decode", seconds, tokens, "tokens/s")
+    seconds, _ = best_of(repeat, lambda: tokenizer.decode_batch(sequences))
+    record("tokenizer.decode_batch", seconds, tokens, "tokens/s")
+
+    timings = [cold_start(model_path, workdir) for _ in range(repeat)]
+    for (case, key) in (("import", "import"), ("mapper construction", "mapper"), ("tokenizer construction", "tokenizer")):
+        record(case, min(timing[key] for timing in timings), 1, "per s")
+    return results
+
+# compare the results with the baseline, returning the regressed cases.
+def compare(results:dict, baseline:dict, threshold:float) -> list[str]:
+    regressed = []
+    print(f"\n{'case':>28}  {'baseline':>14}  {'current':>14}  change")
+    for case, base in baseline["results"].items():
+        if case not in results:
+            print(f"{case:>28}  {base['rate']:14.1f}  {'missing':>14}")
+            continue
+        change = results[case]["rate"] / base["rate"] - 1
+        flag = ""
+        if change < -threshold:
+            regressed.append(case)
+            flag = "  REGRESSED"
+        print(f"{case:>28}  {base['rate']:14.1f}  {results[case]['rate']:14.1f}  {change:+7.1%}{flag}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Indic mapper and tokenizer against a JSON baseline")
+    parser.add_argument("--size", type=float, default=2, help="size of the synthetic corpus in MB")
+    parser.add_argument("--mix", type=str, default=None, help="script mix of the corpus, e.g. ta=0.5,ml=0.3,en=0.2")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the corpus generator")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of each case, the best one counts")
+    parser.add_argument("--baseline", type=str, default=None, help="baseline JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown allowed against the baseline")
+    parser.add_argument("--save-baseline", type=str, default=None, help="save the results as a baseline JSON")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    corpus = {"size_mb": args.size, "mix": mix, "seed": args.seed}
+    lines = generate_lines(args.size, mix, args.seed)
+    print(f"corpus: {args.size} MB, {len(lines)} lines, {mix=}")
+
+    import tokenizers
+    environment = {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                   "tokenizers": tokenizers.__version__}
+    with tempfile.TemporaryDirectory() as workdir:
+        # the logs of the modules go into the work directory.
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            results = run_suite(lines, args.repeat, workdir)
+        finally:
+            os.chdir(cwd)
+
+    report = {"environment": environment, "corpus": corpus, "results": results}
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as fw:
+            json.dump(report, fw, indent=2)
+            fw.close()
+        print(f"saved the baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as fh:
+            baseline = json.load(fh)
+            fh.close()
+        if baseline.get("corpus") != corpus or baseline.get("environment") != environment:
+            print("warning: the baseline was recorded on a different corpus or environment")
+        regressed = compare(results, baseline, args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} case(s) regressed by more than {args.threshold:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+        print(f"\nno regressions beyond {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+# side-by-side throughput of the compiled encoder against the reference trie encoder.
+# usage: indic-unicode-mapper-benchmark.py [<corpus-file>|<size-in-MB>] [lang]
+
+import os
+import sys
+import time
+
+from indic_unicode_mapper import IndicUnicodeMapper
+from synthetic_corpus import generate_lines
+
+m = IndicUnicodeMapper()
+
+_source = sys.argv[1] if len(sys.argv) > 1 else "4"
+_lang = sys.argv[2] if len(sys.argv) > 2 else "ta"
+
+if os.path.isfile(_source):
+    with open(_source, "r") as fh:
+        text = fh.read()
+        fh.close()
+else:
+    # build a synthetic Tamil/Malayalam corpus of the requested size from the mapper letters.
+    text = "".join(generate_lines(float(_source), {"ta": 0.5, "ml": 0.5}))
+
+print(f"corpus: {len(text.encode('utf-8')) / 1024 / 1024:.2f} MB, {len(text)} characters, {_lang=}")
+
+# warm up the compiled engine so that the compilation is not timed.
+m.encode("", lang=_lang)
+
+results = {}
+for name, encoder in (("reference", m.encode_reference), ("compiled", m.encode)):
+    start = time.perf_counter()
+    results[name] = encoder(text, lang=_lang)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>10}: {elapsed:8.3f} s, {len(text) / elapsed / 1e6:8.3f} M chars/s")
+
+# both the encoders should produce identical output.
+assert results["reference"] == results["compiled"]
+print("outputs are identical.")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+# construction time and memory of the mapper instances, and of a forked worker creating its own.
+# usage: indic-unicode-mapper-construction-benchmark.py [instances]
+
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+# resident set size of the process in KB.
+def rss_kb(pid:str="self") -> int:
+    with open(f"/proc/{pid}/status", "r") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+# construct a mapper in a forked worker, returning the time taken.
+def construct_in_worker(_) -> float:
+    start = time.perf_counter()
+    IndicUnicodeMapper().encode("தமிழ்")
+    return time.perf_counter() - start
+
+_instances = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+start = time.perf_counter()
+from indic_unicode_mapper import IndicUnicodeMapper
+print(f"import: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+base_rss = rss_kb()
+start = time.perf_counter()
+first = IndicUnicodeMapper()
+first.encode("தமிழ்")
+print(f"first instance (with the engine): {(time.perf_counter() - start) * 1000:.2f} ms, rss +{rss_kb() - base_rss} KB")
+
+tracemalloc.start()
+base_rss = rss_kb()
+start = time.perf_counter()
+mappers = [IndicUnicodeMapper() for _ in range(_instances)]
+for m in mappers:
+    m.encode("தமிழ்")
+elapsed = time.perf_counter() - start
+(current, _) = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+print(f"next {_instances} instances: {elapsed / _instances * 1e6:.2f} us each, "
+      f"{current / _instances:.0f} bytes traced each, rss +{rss_kb() - base_rss} KB in total")
+
+# the forked workers inherit the tables, they should not rebuild them.
+if "fork" in multiprocessing.get_all_start_methods():
+    with multiprocessing.get_context("fork").Pool(2) as pool:
+        timings = pool.map(construct_in_worker, range(2))
+    print(f"forked worker instance: {max(timings) * 1000:.3f} ms")
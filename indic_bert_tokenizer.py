@@ -9,14 +9,246 @@ indic_bert_tokenizer.py
 This module implements an Indic BERT WordPiece Tokenizer using the Indic Unicode Mapper. It provides methods to build the tokenizer model from text files and to encode/decode Indic text.
 """
 
+from tokenizers import Tokenizer, Regex, normalizers, decoders
 from tokenizers.implementations import BertWordPieceTokenizer
 from indic_unicode_mapper import IndicUnicodeMapper
+from encode_cache import EncodeCache
+from mapped_cache import MappedShardCache
+from incremental_decoder import IncrementalDecoder
+from instrumentation import instrumentation
+from time import perf_counter
 import tempfile
 import os
 import multiprocessing
 import shutil
+import re
+import codecs
+import hashlib
+import json
+import gzip
+import heapq
+import unicodedata
+from collections import Counter
+from functools import partial
+from itertools import islice, groupby, chain
+from collections import deque
 from logger import get_logger
 
+# numpy is only needed for the array outputs of the batches, install it with the numpy extra.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the characters with the unicode White_Space property, which the BERT pre-tokenizer splits the words on.
+_whitespace = re.compile("[\t\n\v\f\r \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]+")
+
+# the CJK ideographs, which the BERT normalizer puts spaces around (handle_chinese_chars).
+_cjk = ((0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF), (0x20000, 0x2A6DF), (0x2A700, 0x2B73F),
+        (0x2B740, 0x2B81F), (0x2B920, 0x2CEAF), (0x2F800, 0x2FA1F))
+
+# check if the BERT pre-tokenizer ends a word at the character, as it does on the whitespace,
+# the punctuations and the CJK ideographs. none of them is part of a grapheme the mapper merges.
+def _is_word_break(c:str) -> bool:
+    cp = ord(c)
+    if 33 <= cp <= 47 or 58 <= cp <= 64 or 91 <= cp <= 96 or 123 <= cp <= 126 or _whitespace.match(c):
+        return True
+    if any(low <= cp <= high for (low, high) in _cjk):
+        return True
+    return unicodedata.category(c).startswith("P")
+
+# read a file object in chunks.
+def _read_chunks(fh, chunk_size:int):
+    while chunk := fh.read(chunk_size):
+        yield chunk
+
+# mapper of the worker processes, created once per worker.
+_worker_mapper = None
+
+# the mapper of the parent is pickled by its table path, so the workers map with the same table.
+def _init_worker(mapper:IndicUnicodeMapper=None):
+    global _worker_mapper
+    _worker_mapper = mapper if mapper is not None else IndicUnicodeMapper()
+
+# map a chunk of texts in a worker process, optionally along with their alignments.
+def _map_texts(texts:list[str], lang:str="ta", alignment:bool=False) -> list:
+    if alignment:
+        return [_worker_mapper.encode_with_alignment(text, lang=lang) for text in texts]
+    return [_worker_mapper.encode(text, lang=lang) for text in texts]
+
+# bring the token offsets of an encoding over the mapped text back to the original text.
+def _original_offsets(encoding, alignment:list[int]) -> list[tuple[int, int]]:
+    return [(alignment[start], alignment[end]) for (start, end) in encoding.offsets]
+
+# the kinds of the array outputs of the batches.
+_array_kinds = ("padded", "ragged")
+
+# check the array output requested of a batch, returning the dtype of the token ids.
+def _array_dtype(arrays:str, dtype, vocab_size:int):
+    if arrays not in _array_kinds:
+        raise ValueError(f"unknown array output {arrays=}, expected one of {_array_kinds}")
+    if np is None:
+        raise ImportError("the array outputs need numpy, install it with: pip install indic_tokenizer[numpy]")
+    dtype = np.dtype(dtype)
+    if dtype.kind not in "iu" or np.iinfo(dtype).max < vocab_size - 1:
+        raise ValueError(f"the token ids need an integer dtype holding {vocab_size} tokens, got {dtype=}")
+    return dtype
+
+# turn the encodings into contiguous arrays, without keeping any python object per token.
+# padded: input_ids and attention_mask of shape (batch, length), right padded with pad_id unless the tokenizer padded them.
+# ragged: input_ids of all the sequences back to back, and their offsets into it with a trailing one for the end.
+# both come with the lengths of the sequences, padding excluded.
+def _to_arrays(encodings:list, arrays:str, dtype, pad_id:int, padded:bool) -> dict:
+    count = len(encodings)
+    sizes = np.fromiter(map(len, encodings), dtype=np.int64, count=count)
+    total = int(sizes.sum())
+    ids = np.fromiter(chain.from_iterable(encoding.ids for encoding in encodings), dtype=dtype, count=total)
+    # the padding of the tokenizer is told apart by the attention masks.
+    mask = np.fromiter(chain.from_iterable(encoding.attention_mask for encoding in encodings), dtype=bool, count=total) if padded else None
+    if mask is None:
+        lengths = sizes
+    else:
+        ends = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+        lengths = ends[np.cumsum(sizes)] - ends[np.cumsum(sizes) - sizes]
+
+    if arrays == "ragged":
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return {"input_ids": ids if mask is None else ids[mask], "offsets": offsets, "lengths": lengths}
+
+    width = int(sizes.max()) if count else 0
+    if mask is not None or (sizes == width).all():
+        # the tokenizer padded them all to the same length already.
+        input_ids = ids.reshape(count, width)
+        attention_mask = mask.reshape(count, width).astype(dtype) if mask is not None else np.ones((count, width), dtype=dtype)
+    else:
+        positions = np.arange(width) < sizes[:, None]
+        input_ids = np.full((count, width), pad_id, dtype=dtype)
+        input_ids[positions] = ids
+        attention_mask = positions.astype(dtype)
+    return {"input_ids": input_ids, "attention_mask": attention_mask, "lengths": lengths}
+
+# split the files into byte ranges of about shard_size bytes each.
+def _shard_files(files:list[str], shard_size:int) -> list[tuple[str, int, int]]:
+    shards = []
+    for file in files:
+        size = os.path.getsize(file)
+        for start in range(0, max(size, 1), shard_size):
+            shards.append((file, start, min(start + shard_size, size)))
+    return shards
+
+# read the lines starting within the byte range of a shard.
+def _read_shard(file:str, start:int, end:int):
+    with open(file, "rb") as fh:
+        if start > 0:
+            # the line running across the start belongs to the previous shard.
+            fh.seek(start - 1)
+            fh.readline()
+        position = fh.tell()
+        while position < end and (line := fh.readline()):
+            position += len(line)
+            yield line.decode("utf-8")
+
+# map a shard, either into the given output file or into the list of its mapped lines.
+def _map_shard(shard:tuple[str, int, int], out_path:str=None, mapper:IndicUnicodeMapper=None):
+    mapper = mapper if mapper is not None else _worker_mapper
+    if out_path is None:
+        # the trainer takes the lines one by one, as it does from the in-process stream.
+        return [mapper.encode(line) for line in _read_shard(*shard)]
+    mapped = "".join(mapper.encode(line) for line in _read_shard(*shard))
+    with open(out_path, "w") as fw:
+        fw.write(mapped)
+        fw.close()
+    return out_path
+
+# map a shard into the given file, returning its path.
+def _map_shard_to_file(task:tuple[tuple[str, int, int], str], mapper:IndicUnicodeMapper=None) -> str:
+    (shard, out_path) = task
+    return _map_shard(shard, out_path, mapper)
+
+# run the function over the items on the pool, in order, keeping at most window items in flight.
+def _imap_bounded(pool, func, items, window:int):
+    pending = deque()
+    for item in items:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+# the header of the word count files, with the format version and the mapping table hash.
+_counts_magic = "#indic-word-counts"
+_counts_format = "1"
+
+# the pattern of the words the WordPiece trainer counts, split as the BERT normalizer and pre-tokenizer configured
+# in build_model split them: on the whitespace, with each punctuation and each CJK ideograph a word of its own.
+# created on first use, as the punctuations are found by running the pre-tokenizer over the code points
+# of the first two planes (there are none past them), so that they follow its unicode version, not the one of python.
+_word_pattern = None
+
+# get the pattern of the words, without making a python object per word the way pre_tokenize_str does.
+def _words():
+    global _word_pattern
+    if _word_pattern is None:
+        pre_tokenizer = BertWordPieceTokenizer(clean_text=False, handle_chinese_chars=True, strip_accents=False, lowercase=False)._tokenizer.pre_tokenizer
+        # the code points between the surrogates and the CJK ideographs.
+        (tested, start) = ([], 0)
+        for (low, high) in sorted([(0xD800, 0xDFFF)] + [(low, high) for (low, high) in _cjk if low < 0x20000]):
+            tested.append(range(start, low))
+            start = high + 1
+        tested.append(range(start, 0x20000))
+        # a character split off from the letters around it is a word of its own.
+        words = pre_tokenizer.pre_tokenize_str("a".join(map(chr, chain.from_iterable(tested))))
+        isolated = sorted({ord(word) for (word, _) in words if len(word) == 1 and word != "a"})
+        breaks = list(_cjk)
+        for cp in isolated:
+            if breaks[-1][1] == cp - 1:
+                breaks[-1] = (breaks[-1][0], cp)
+            else:
+                breaks.append((cp, cp))
+        singles = "".join(f"\\U{low:08x}-\\U{high:08x}" for (low, high) in breaks)
+        _word_pattern = re.compile(f"[{singles}]|[^{singles}{_whitespace.pattern[1:-2]}]+")
+    return _word_pattern
+
+# count the words of the mapped lines of a shard, the same way the trainer does.
+def _count_shard(shard:tuple[str, int, int], chunk_lines:int=10000, mapper:IndicUnicodeMapper=None) -> Counter:
+    mapper = mapper if mapper is not None else _worker_mapper
+    words = _words()
+    counts = Counter()
+    lines = _read_shard(*shard)
+    # the lines are split together, as the newline is a word break.
+    while chunk := list(islice(lines, chunk_lines)):
+        counts.update(words.findall("".join(mapper.encode(line) for line in chunk)))
+    return counts
+
+# read the (word, count) pairs of a word count file, in the order of the words.
+def _read_counts(path:str, table_hash:str):
+    with gzip.open(path, "rt", encoding="utf-8", newline="\n") as fh:
+        header = fh.readline().rstrip("\n").split("\t")
+        if header[:2] != [_counts_magic, _counts_format]:
+            raise ValueError(f"{path} is not a word count file of format {_counts_format}")
+        if header[2] != table_hash:
+            raise ValueError(f"{path} was counted with a different mapping table ({header[2][:12]})")
+        for line in fh:
+            (word, count) = line.rstrip("\n").split("\t")
+            yield word, int(count)
+
+# repeat each word as many times as it was counted, in pieces of about 1 MB, for the trainer to count again.
+def _repeat_words(counts):
+    for word, count in counts:
+        per_piece = max(1, (1 << 20) // (len(word) + 1))
+        while count > 0:
+            yield (word + " ") * min(count, per_piece)
+            count -= per_piece
+
+# count the tokens of the initial alphabet the trainer starts the vocabulary with, given the tokens in the order of their ids:
+# the special tokens, the characters and their ## continuations, which come before the merged tokens of two characters or more.
+def _alphabet_size(tokens:list[str], special_tokens) -> int:
+    for index, token in enumerate(tokens):
+        if token not in special_tokens and len(token.removeprefix("##")) != 1:
+            return index
+    return len(tokens)
+
 # Extension of the Bert WP Tokenizer in the Indic context (Tamil for starters)
 class IndicBertWordPieceTokenizer:
     __unk_token = "[unk]"  # token for unknown words
@@ -24,70 +256,203 @@ class IndicBertWordPieceTokenizer:
     __sep_token = "[sep]"
     __mask_token = "[mask]"
     __pad_token = "[pad]"
+    __special_tokens = (__unk_token, __cls_token, __sep_token, __mask_token, __pad_token)
+    # stands in for the mapped characters missing from the vocabulary (see to_tokenizer).
+    __placeholder = "\ue000"
 
     @staticmethod
-    def build_model(files:list[str], model_dir:str="./", vocab_size:int=30000, min_frequency:int=2, human_readable:bool=False):
+    def build_model(files:list[str], model_dir:str="./", vocab_size:int|list[int]=30000, min_frequency:int=2, human_readable:bool=False,
+                    streaming:bool=False, chunk_lines:int=10000, num_workers:int=None, shard_size:int=64*1024*1024,
+                    cache_dir:str=None, cache_max_bytes:int=None, stream_bytes:int=256*1024*1024):
         """
         Build the vocabulary for the tokenizer from the given files.
         :param files: List of files to build the vocabulary from.
-        :param vocab_size: Size of the vocabulary to build.
+        :param vocab_size: Size of the vocabulary to build, or a list of the sizes to sweep:
+                           the corpus is then mapped and trained on once, for the largest size,
+                           and the vocabularies are saved into model_dir/vocab-<size>.
         :param min_frequency: Minimum frequency of words to include in the vocabulary.
+        :param streaming: Map the lines lazily and train from an iterator, without the intermediate mapped files.
+        :param chunk_lines: Number of lines mapped at a time when streaming in-process.
+        :param num_workers: Number of worker processes mapping the shards (default is the number of cores).
+        :param shard_size: Size in bytes of the file ranges handed over to the workers.
+        :param cache_dir: Directory to keep the mapped shards in across the builds (see MappedShardCache),
+                          so that only the new or changed files get mapped. Not used with streaming.
+        :param cache_max_bytes: Size the cache is trimmed down to after the build, by evicting the least recently used shards.
+        :param stream_bytes: Bytes of the corpus in flight between the workers and the trainer when streaming with workers,
+                             the file ranges are cut small enough for them to stay within it.
         """
+        if streaming and cache_dir is not None:
+            raise ValueError("the mapped shard cache is not used when streaming, pass either streaming or cache_dir")
+        if stream_bytes <= 0:
+            raise ValueError(f"stream_bytes should be positive, got {stream_bytes=}")
         logger = get_logger("IndicBERTWPETokenizer.build_model")
+        (vocab_size, sweep) = IndicBertWordPieceTokenizer.__sweep_sizes(vocab_size)
+        started = perf_counter()
 
         # create the mapper object
         mapper = IndicUnicodeMapper()
-        # create a temporary directory to store the mapped files
-        tmpdir = tempfile.TemporaryDirectory().name
-        os.makedirs(tmpdir, exist_ok=True)
-        logger.info(f"Using temporary directory {tmpdir} for mapped files.")
-        # list of mapped files.
-        nfiles = []
-        logger.info(f"Processing {len(files)} files for vocabulary building.")       
-        for file in files:
-            fname = os.path.basename(file)
-            fpath = tmpdir + "/" + fname
-            logger.info(f"Processing file {file} -> {fpath}")
-            # open the file and map the contents to higher unicode values
-            # this is to ensure that the tokenizer can handle the Indic text properly.
-            with open(fpath, "w") as fw:
-                # read the file line by line and encode each line
-                with open(file, "r") as fh:
-                    lines = fh.readlines()
-                    fh.close()
-                    # create a pool of workers to encode the lines
-                    tpool = multiprocessing.Pool()
-                    elines = tpool.map(mapper.encode, lines)
-                    tpool.close()
-                    # combined the encoded lines into a single string
-                    etext = "\n".join(elines)
-                # write the encoded text to the file
-                fw.write(etext)
-                fw.close()
-            # add the file path to the list of mapped files
-            nfiles.append(fpath)
-        
+
         # create the tokenizer instance
+        tokenizer, special_tokens = IndicBertWordPieceTokenizer.__new_base_tokenizer()
+
+        # the files are split into byte ranges and mapped by a single pool of workers,
+        # each of them reading its own range, so that the corpus never passes through here.
+        num_workers = num_workers if num_workers is not None else os.cpu_count()
+        if streaming and num_workers > 1:
+            # the mapped ranges wait in memory until the trainer takes them, 2 * num_workers of them at most.
+            shard_size = max(1, min(shard_size, stream_bytes // (2 * num_workers)))
+        shards = _shard_files(files, shard_size)
+        logger.info(f"Processing {len(files)} files in {len(shards)} shards with {num_workers} workers.")
+        if instrumentation.enabled:
+            instrumentation.gauge("build_model.num_workers", num_workers)
+            instrumentation.gauge("build_model.shards", len(shards))
+            instrumentation.gauge("build_model.shard_size", shard_size)
+            instrumentation.gauge("build_model.chunk_lines", chunk_lines)
+        tpool = multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(mapper,)) if num_workers > 1 else None
+
+        tmpdir = None
+        cache = None
+        try:
+            if streaming:
+                # the mapped lines are fed to the trainer shard by shard, so the memory stays flat.
+                if tpool is not None:
+                    iterator = _imap_bounded(tpool, _map_shard, shards, window=2 * num_workers)
+                else:
+                    logger.info(f"Streaming in chunks of {chunk_lines} lines.")
+                    iterator = IndicBertWordPieceTokenizer.__stream_mapped(files, mapper, chunk_lines)
+                logger.info(f"Training tokenizer with vocab size {vocab_size} and min frequency {min_frequency}")
+                start = perf_counter() if instrumentation.enabled else None
+                tokenizer.train_from_iterator(iterator, vocab_size=vocab_size, min_frequency=min_frequency,
+                                              limit_alphabet=512, wordpieces_prefix='##', special_tokens=special_tokens)
+                if start is not None:
+                    # the mapping runs along with the training here.
+                    instrumentation.stage("build_model.map_and_train", start)
+            else:
+                start = perf_counter() if instrumentation.enabled else None
+                # each shard is mapped into a file of its own.
+                if cache_dir is not None:
+                    # the shards cached by earlier builds are reused, and the missing ones are mapped in place.
+                    cache = MappedShardCache(cache_dir, cache_max_bytes)
+                    hashes = {file: cache.file_hash(file) for file in files}
+                    table_hash = mapper.table_hash
+                    nfiles = [cache.shard_path(hashes[file], begin, end, table_hash) for (file, begin, end) in shards]
+                    # the files of the same content share their shards, which are mapped only once
+                    # and still trained on once per file.
+                    missing = {}
+                    for shard, path in zip(shards, nfiles):
+                        if path not in missing and not cache.lookup(path):
+                            missing[path] = shard
+                    logger.info(f"Reusing {len(shards) - len(missing)} of {len(shards)} mapped shards from {cache_dir}.")
+                    if start is not None:
+                        instrumentation.count("build_model.cache_hits", len(shards) - len(missing))
+                        instrumentation.count("build_model.cache_misses", len(missing))
+                    # a shard is mapped under a temporary name first, so a cached shard is never partial.
+                    tasks = [(shard, f"{path}.{os.getpid()}.tmp") for path, shard in missing.items()]
+                else:
+                    # create a temporary directory to store the mapped files
+                    tmpdir = tempfile.TemporaryDirectory().name
+                    os.makedirs(tmpdir, exist_ok=True)
+                    logger.info(f"Using temporary directory {tmpdir} for mapped files.")
+                    nfiles = [os.path.join(tmpdir, f"{index:06d}-{os.path.basename(shard[0])}") for index, shard in enumerate(shards)]
+                    tasks = list(zip(shards, nfiles))
+                if tpool is not None:
+                    list(tpool.imap(_map_shard_to_file, tasks, chunksize=max(1, len(tasks) // (num_workers * 4))))
+                else:
+                    for task in tasks:
+                        _map_shard_to_file(task, mapper)
+                if cache is not None:
+                    for path, (_, tmp_path) in zip(missing, tasks):
+                        os.replace(tmp_path, path)
+                    cache.save()
+                if start is not None:
+                    instrumentation.stage("build_model.map", start)
+
+                # train the tokenizer on the provided files
+                logger.info(f"Training tokenizer on {len(nfiles)} files with vocab size {vocab_size} and min frequency {min_frequency}")
+                start = perf_counter() if instrumentation.enabled else None
+                tokenizer.train(files=nfiles, vocab_size=vocab_size, min_frequency=min_frequency,
+                                limit_alphabet=512, wordpieces_prefix='##', special_tokens=special_tokens)
+                if start is not None:
+                    instrumentation.stage("build_model.train", start)
+        finally:
+            if tpool is not None:
+                tpool.close()
+                tpool.join()
+
+        # clean up the temporary directory
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        if cache is not None:
+            evicted = cache.evict(keep=set(nfiles))
+            logger.info(f"Evicted {len(evicted)} mapped shards, the cache holds {cache.size()} bytes.")
+        return IndicBertWordPieceTokenizer.__save_model(tokenizer, mapper, model_dir, human_readable, logger, sweep, started)
+
+    # get the size to train for, and the sorted sizes of a sweep (None if a single size is asked for).
+    @staticmethod
+    def __sweep_sizes(vocab_size) -> tuple:
+        if isinstance(vocab_size, int):
+            return vocab_size, None
+        sizes = sorted(set(vocab_size))
+        if not sizes or sizes[0] <= 0:
+            raise ValueError(f"the vocabulary sizes to sweep should be positive, got {vocab_size=}")
+        return sizes[-1], sizes
+
+    # create the base tokenizer to train, and the list of its special tokens.
+    @staticmethod
+    def __new_base_tokenizer():
         # we use the BertWordPieceTokenizer from the tokenizers library
         tokenizer = BertWordPieceTokenizer(clean_text=False, handle_chinese_chars=True, 
                                            strip_accents=False, lowercase=False,
                                            sep_token=IndicBertWordPieceTokenizer.__sep_token, unk_token=IndicBertWordPieceTokenizer.__unk_token, 
                                            mask_token=IndicBertWordPieceTokenizer.__mask_token, cls_token=IndicBertWordPieceTokenizer.__cls_token, 
                                            pad_token=IndicBertWordPieceTokenizer.__pad_token)
-        
-        # train the tokenizer on the provided files
-        logger.info(f"Training tokenizer on {len(nfiles)} files with vocab size {vocab_size} and min frequency {min_frequency}")
-        tokenizer.train(files=nfiles, vocab_size=vocab_size, min_frequency=min_frequency,
-                        limit_alphabet=512, wordpieces_prefix='##',
-                        special_tokens=[IndicBertWordPieceTokenizer.__unk_token, IndicBertWordPieceTokenizer.__sep_token, 
-                                        IndicBertWordPieceTokenizer.__mask_token, IndicBertWordPieceTokenizer.__cls_token, 
-                                        IndicBertWordPieceTokenizer.__pad_token])
-        # save the tokenizer model
+        special_tokens = [IndicBertWordPieceTokenizer.__unk_token, IndicBertWordPieceTokenizer.__sep_token, 
+                          IndicBertWordPieceTokenizer.__mask_token, IndicBertWordPieceTokenizer.__cls_token, 
+                          IndicBertWordPieceTokenizer.__pad_token]
+        return tokenizer, special_tokens
+
+    # save the trained vocabulary along with the mapping table, and load it back.
+    # for a sweep, each vocabulary is the first <size> tokens of the trained one, saved into model_dir/vocab-<size>.
+    # the trainer adds the merges one after the other in the order of their counts, whatever the target size,
+    # so those tokens are the vocabulary a build with that size gives (up to the ties among equal counts).
+    # the trainer keeps its whole initial alphabet even past the target size, so no cut goes below the alphabet.
+    @staticmethod
+    def __save_model(tokenizer:BertWordPieceTokenizer, mapper:IndicUnicodeMapper, model_dir:str, human_readable:bool, logger,
+                     sweep:list[int]=None, started:float=None):
+        if sweep is None:
+            # save the tokenizer model
+            logger.info(f"Saving tokenizer model to {model_dir}/indic-bert-tokenizer-vocab.txt")
+            tokenizer.save_model(model_dir, "indic-bert-tokenizer")
+            return IndicBertWordPieceTokenizer.__finish_model(mapper, model_dir, human_readable, logger)
+
+        trained = perf_counter() - started
+        vocab = [token for (token, _) in sorted(tokenizer.get_vocab().items(), key=lambda item: item[1])]
+        alphabet = _alphabet_size(vocab, IndicBertWordPieceTokenizer.__special_tokens)
+        logger.info(f"Trained a vocabulary of {len(vocab)} tokens ({alphabet} of them the alphabet) in {trained:.2f}s, saving the sizes {sweep}")
+        tokenizers = {}
+        for size in sweep:
+            start = perf_counter()
+            if size > len(vocab):
+                logger.warning(f"only {len(vocab)} tokens reach min_frequency, the vocabulary of size {size} is smaller")
+            elif size < alphabet:
+                logger.warning(f"the alphabet alone has {alphabet} tokens, the vocabulary of size {size} is larger")
+            size_dir = os.path.join(model_dir, f"vocab-{size}")
+            os.makedirs(size_dir, exist_ok=True)
+            with open(os.path.join(size_dir, "indic-bert-tokenizer-vocab.txt"), "w") as fw:
+                fw.writelines(token + "\n" for token in vocab[:max(size, alphabet)])
+                fw.close()
+            tokenizers[size] = IndicBertWordPieceTokenizer.__finish_model(mapper, size_dir, human_readable, logger)
+            logger.info(f"Built the vocabulary of size {size} in {trained + perf_counter() - start:.2f}s "
+                        f"({trained:.2f}s of it shared by the sweep) at {size_dir}")
+        return tokenizers
+
+    # save the mapping table and the human readable vocabulary next to the saved vocabulary, and load it.
+    @staticmethod
+    def __finish_model(mapper:IndicUnicodeMapper, model_dir:str, human_readable:bool, logger):
         _outbase = "indic-bert-tokenizer"
-        logger.info(f"Saving tokenizer model to {model_dir}/{_outbase}-vocab.txt")
-        tokenizer.save_model(model_dir, _outbase)
-        # clean up the temporary directory
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        # keep the mapping table the vocabulary was built with next to it.
+        table_hash = mapper.save_table(IndicBertWordPieceTokenizer.mapping_path(os.path.join(model_dir, _outbase + "-vocab.txt")))
+        logger.info(f"Saved the mapping table {table_hash[:12]} along with the vocabulary.")
 
         # let's create another vocabulary for humans to understand.
         if human_readable:
@@ -105,27 +470,272 @@ class IndicBertWordPieceTokenizer:
         # return the tokenizer instance with the vocabulary file
         return IndicBertWordPieceTokenizer(model_path=os.path.join(model_dir, _outbase + "-vocab.txt"))
                     
-    def __init__(self, model_path:str):
+    # read the files lazily and map their lines in bounded chunks.
+    @staticmethod
+    def __stream_mapped(files:list[str], mapper:IndicUnicodeMapper, chunk_lines:int):
+        for file in files:
+            with open(file, "r") as fh:
+                while (lines := list(islice(fh, chunk_lines))):
+                    yield [mapper.encode(line) for line in lines]
+
+    @staticmethod
+    def count_words(files:list[str], out_path:str, shard_index:int=0, num_shards:int=1, num_workers:int=None,
+                    shard_size:int=64*1024*1024, chunk_lines:int=10000) -> dict:
+        """
+        The count phase of the two-phase build: map a share of the corpus and count its words into a word count file.
+        The shares are independent, so they can be counted on separate machines and merged with build_model_from_counts.
+        :param files: List of files of the whole corpus.
+        :param out_path: Path of the word count file to write (gzipped tab separated word and count, sorted by word).
+        :param shard_index: Index of the share of the corpus to count, from 0 to num_shards - 1.
+        :param num_shards: Number of the shares the corpus is split into.
+        :param num_workers: Number of worker processes counting on this machine (default is the number of cores).
+        :param shard_size: Size in bytes of the file ranges the corpus is split into.
+        :param chunk_lines: Number of lines mapped and split at a time.
+        :return: Dictionary of the numbers of ranges, words and distinct words counted.
+        """
+        if not 0 <= shard_index < num_shards:
+            raise ValueError(f"the shard index should be within [0, {num_shards}), got {shard_index=}")
+        logger = get_logger("IndicBERTWPETokenizer.count_words")
+        mapper = IndicUnicodeMapper()
+        # the byte ranges are dealt out to the shares in turn, so the shares are about the same size.
+        ranges = _shard_files(files, shard_size)[shard_index::num_shards]
+        num_workers = num_workers if num_workers is not None else os.cpu_count()
+        logger.info(f"Counting share {shard_index} of {num_shards}: {len(ranges)} ranges with {num_workers} workers.")
+
+        counts = Counter()
+        count = partial(_count_shard, chunk_lines=chunk_lines)
+        if num_workers > 1 and len(ranges) > 1:
+            with multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(mapper,)) as tpool:
+                for partial_counts in tpool.imap_unordered(count, ranges):
+                    counts.update(partial_counts)
+        else:
+            for shard in ranges:
+                counts.update(_count_shard(shard, chunk_lines, mapper))
+
+        # written under a temporary name first, so that a failed run leaves no partial file behind.
+        # the fastest compression level, the default one takes longer than the counting.
+        with gzip.open(out_path + ".tmp", "wt", compresslevel=1, encoding="utf-8", newline="\n") as fw:
+            fw.write(f"{_counts_magic}\t{_counts_format}\t{mapper.table_hash}\n")
+            fw.writelines(f"{word}\t{counts[word]}\n" for word in sorted(counts))
+            fw.close()
+        os.replace(out_path + ".tmp", out_path)
+        summary = {"ranges": len(ranges), "words": sum(counts.values()), "distinct": len(counts)}
+        logger.info(f"Wrote {summary['distinct']} distinct words of {summary['words']} to {out_path}")
+        return summary
+
+    @staticmethod
+    def build_model_from_counts(count_files:list[str], model_dir:str="./", vocab_size:int|list[int]=30000, min_frequency:int=2,
+                                human_readable:bool=False):
+        """
+        The merge phase of the two-phase build: combine the word count files (see count_words) and train the vocabulary
+        from the total counts. The vocabulary is the one build_model builds from the whole corpus (up to the ties among equal counts).
+        The files are merged in a single streaming pass, as they are sorted by word, but the trainer is fed every word
+        as many times as it was counted, so this phase runs on one machine and takes about as long as the training of build_model.
+        :param count_files: List of the word count files, one for each share of the corpus.
+        :param vocab_size: Size of the vocabulary to build, or a list of the sizes to sweep (see build_model).
+        :param min_frequency: Minimum frequency of words to include in the vocabulary.
+        """
+        logger = get_logger("IndicBERTWPETokenizer.build_model_from_counts")
+        (vocab_size, sweep) = IndicBertWordPieceTokenizer.__sweep_sizes(vocab_size)
+        started = perf_counter()
+        mapper = IndicUnicodeMapper()
+        tokenizer, special_tokens = IndicBertWordPieceTokenizer.__new_base_tokenizer()
+
+        # the counts of a word come one after the other out of the merged files.
+        merged = heapq.merge(*(_read_counts(path, mapper.table_hash) for path in count_files))
+        totals = ((word, sum(count for (_, count) in group)) for word, group in groupby(merged, key=lambda item: item[0]))
+        logger.info(f"Training tokenizer on {len(count_files)} count files with vocab size {vocab_size} and min frequency {min_frequency}")
+        start = perf_counter() if instrumentation.enabled else None
+        tokenizer.train_from_iterator(_repeat_words(totals), vocab_size=vocab_size, min_frequency=min_frequency,
+                                      limit_alphabet=512, wordpieces_prefix='##', special_tokens=special_tokens)
+        if start is not None:
+            instrumentation.stage("build_model.train", start)
+        return IndicBertWordPieceTokenizer.__save_model(tokenizer, mapper, model_dir, human_readable, logger, sweep, started)
+
+    @staticmethod
+    def mapping_path(model_path:str) -> str:
+        """
+        Get the path of the mapping table saved along with a vocabulary file by build_model.
+        """
+        return re.sub(r"-vocab\.txt$", "", model_path) + "-mapping.bin"
+
+    def __init__(self, model_path:str, mapping_path:str=None, cache_size:int=0):
+        """
+        Load the tokenizer from a vocabulary file.
+        :param model_path: Path of the vocabulary file.
+        :param mapping_path: Optional binary mapping table to load, instead of building the built-in one.
+        The mapping table saved along with the vocabulary, if any, should match the one in use.
+        :param cache_size: Number of words to cache the token ids of, for encode_ids (default is 0, no cache).
+        """
         # initialize our indic unicode mapper
-        self._mapper = IndicUnicodeMapper()
+        self._mapper = IndicUnicodeMapper(table_path=mapping_path)
+        # the vocabulary is only meaningful with the mapping it was built with.
+        expected = self.mapping_path(model_path)
+        if os.path.isfile(expected):
+            if IndicUnicodeMapper.read_table_hash(expected) != self._mapper.table_hash:
+                raise ValueError(f"the mapping table in use does not match the one {model_path} was built with ({expected})")
         # create our base BERT tokenizer
         self._tokenizer = BertWordPieceTokenizer.from_file(model_path, clean_text=False, handle_chinese_chars=True,
                                                            strip_accents=False, lowercase=False,
                                                            sep_token = self.__sep_token, unk_token= self.__unk_token, 
                                                            mask_token=self.__mask_token, cls_token=self.__cls_token, pad_token=self.__pad_token)
+        self.__cls_id = self._tokenizer.token_to_id(self.__cls_token)
+        self.__sep_id = self._tokenizer.token_to_id(self.__sep_token)
+        # cache of the token ids of the words.
+        self._cache = EncodeCache(cache_size) if cache_size > 0 else None
+        # worker pool to map the batches with, created on demand.
+        self._pool = None
+        self._pool_size = 0
 
     # method to encode the indic text
-    def encode(self, text:str, lang="ta"):
+    # with return_offsets, the token offsets into the original text are returned along with the encoding,
+    # as the offsets of the encoding itself point into the mapped text.
+    def encode(self, text:str, lang="ta", return_offsets:bool=False):
+        start = perf_counter() if instrumentation.enabled else None
+        if return_offsets:
+            # the alignment comes out of the same pass that maps the text.
+            norm_text, alignment = self._mapper.encode_with_alignment(text=text, lang=lang)
+            encoding = self._tokenizer.encode(norm_text)
+            offsets = _original_offsets(encoding, alignment)
+            if start is not None:
+                instrumentation.stage("tokenizer.encode", start, chars=len(text), tokens=len(encoding.ids))
+            return encoding, offsets
         # map the indic text to higher unicodes
         norm_text = self._mapper.encode(text=text, lang=lang)
-        # use the base tokenizer to tokenize the mapped text
-        return self._tokenizer.encode(norm_text)
+        if start is None:
+            # use the base tokenizer to tokenize the mapped text
+            return self._tokenizer.encode(norm_text)
+        encoding = self.__wordpiece(norm_text)
+        instrumentation.stage("tokenizer.encode", start, chars=len(text), tokens=len(encoding.ids))
+        return encoding
+
+    # run the mapped text through the base tokenizer, timed as the wordpiece stage.
+    def __wordpiece(self, norm_text:str, add_special_tokens:bool=True):
+        start = perf_counter() if instrumentation.enabled else None
+        encoding = self._tokenizer.encode(norm_text, add_special_tokens=add_special_tokens)
+        if start is not None:
+            instrumentation.stage("tokenizer.wordpiece", start, chars=len(norm_text), tokens=len(encoding.ids))
+        return encoding
     
+    def encode_ids(self, text:str, lang="ta") -> list[int]:
+        """
+        Encode the given text into the token ids, same as encode(text).ids.
+        With the cache enabled, the word pieces of the words seen before are taken from the cache
+        and only the new words go through the WordPiece model.
+        :param text: Text to encode.
+        :param lang: Language of the text, or "auto" for mixed scripts (default is Tamil).
+        :return: List of token ids.
+        """
+        start = perf_counter() if instrumentation.enabled else None
+        tokenizer = self._tokenizer._tokenizer
+        norm_text = self._mapper.encode(text=text, lang=lang)
+        # the special tokens in the text, the padding and the truncation need the full pipeline.
+        if self._cache is None or tokenizer.padding is not None or tokenizer.truncation is not None or \
+                any(token in norm_text for token in self.__special_tokens):
+            ids = self.__wordpiece(norm_text).ids
+            if start is not None:
+                instrumentation.stage("tokenizer.encode_ids", start, chars=len(text), tokens=len(ids))
+            return ids
+
+        # the base tokenizer splits the words on the whitespace first, and then on the punctuations
+        # within them, so the token ids of the text are the ones of its whitespace separated words.
+        (hits, misses) = (self._cache.hits, self._cache.misses)
+        ids = [self.__cls_id]
+        for word in _whitespace.split(norm_text):
+            if not word:
+                continue
+            pieces = self._cache.get(word)
+            if pieces is None:
+                pieces = tuple(self.__wordpiece(word, add_special_tokens=False).ids)
+                self._cache.put(word, pieces)
+            ids.extend(pieces)
+        ids.append(self.__sep_id)
+        if start is not None:
+            instrumentation.count("tokenizer.cache_hits", self._cache.hits - hits)
+            instrumentation.count("tokenizer.cache_misses", self._cache.misses - misses)
+            instrumentation.stage("tokenizer.encode_ids", start, chars=len(text), tokens=len(ids))
+        return ids
+
+    def cache_stats(self) -> dict:
+        """
+        Get the counters of the word cache, None if it is not enabled.
+        """
+        return self._cache.stats() if self._cache is not None else None
+
+    def encode_stream(self, source, lang="ta", chunk_size:int=1024*1024, add_special_tokens:bool=True):
+        """
+        Encode a text too large to hold in memory, from a file object or an iterator of text chunks.
+        Each chunk is encoded up to its last word break, and the partial word (with any partial grapheme in it)
+        is carried over to the next chunk, so the ids add up to encode(text).ids exactly.
+        A word longer than WordPiece takes becomes [unk] as soon as it is known to be, and the rest of it is skipped
+        without being held in memory.
+        :param source: File object (text, or utf-8 binary) or iterator of the str/bytes chunks of the text.
+        :param lang: Language of the text, or "auto" for mixed scripts (default is Tamil).
+        :param chunk_size: Number of characters (bytes) to read from the file object at a time.
+        :param add_special_tokens: Whether to start the ids with [cls] and end them with [sep], as encode does.
+        :return: Generator of the token id lists, one for each chunk encoded.
+        """
+        tokenizer = self._tokenizer._tokenizer
+        if tokenizer.padding is not None or tokenizer.truncation is not None:
+            raise ValueError("encode_stream does not pad or truncate, disable the padding and the truncation first")
+        chunks = _read_chunks(source, chunk_size) if hasattr(source, "read") else source
+        # a partial word maps to at most a grapheme more than it does within the whole word,
+        # so a partial word longer than this is surely too long.
+        max_chars = tokenizer.model.max_input_chars_per_word + 3
+        unk_id = tokenizer.token_to_id(self.__unk_token)
+        utf8 = codecs.getincrementaldecoder("utf-8")()
+
+        ids = [self.__cls_id] if add_special_tokens else []
+        carry = ""
+        skipping = False
+        for chunk in chunks:
+            start = perf_counter() if instrumentation.enabled else None
+            if isinstance(chunk, bytes):
+                chunk = utf8.decode(chunk)
+            if skipping:
+                # the rest of the overlong word runs up to the next word break.
+                brk = next((i for i, c in enumerate(chunk) if _is_word_break(c)), None)
+                if brk is None:
+                    continue
+                (chunk, skipping) = (chunk[brk:], False)
+
+            text = carry + chunk
+            # look back for the last word break, the word after it may go on in the next chunk.
+            # a special token might be starting at an opening bracket, so it goes over along with the word.
+            index = len(text)
+            while index > 0 and not _is_word_break(text[index - 1]):
+                index -= 1
+            if len(self._mapper.encode(text[index:], lang=lang)) > max_chars:
+                # the word is too long for WordPiece already, so it is [unk] whatever follows.
+                (text, carry, skipping) = (text[:index], "", True)
+            else:
+                if index > 0 and text[index - 1] == "[":
+                    index -= 1
+                (text, carry) = (text[:index], text[index:])
+
+            if text:
+                ids.extend(self._tokenizer.encode(self._mapper.encode(text, lang=lang), add_special_tokens=False).ids)
+            if skipping:
+                ids.append(unk_id)
+            if start is not None:
+                instrumentation.stage("tokenizer.encode_stream", start, chars=len(chunk), tokens=len(ids))
+            if ids:
+                yield ids
+                ids = []
+
+        carry += utf8.decode(b"", final=True)
+        if carry and not skipping:
+            ids.extend(self._tokenizer.encode(self._mapper.encode(carry, lang=lang), add_special_tokens=False).ids)
+        if add_special_tokens:
+            ids.append(self.__sep_id)
+        if ids:
+            yield ids
+
     def tokenize(self, text:str, lang="ta"):
         """
         Tokenize the given text using the tokenizer.
         :param text: Text to tokenize.
-        :param lang: Language of the text (default is Tamil).
+        :param lang: Language of the text, or "auto" for mixed scripts (default is Tamil).
         :return: List of tokens.
         """
         # encode the text to get the token ids
@@ -134,12 +744,277 @@ class IndicBertWordPieceTokenizer:
 
     # method to decode the indic text
     def decode(self, ids:list[int]):
+        start = perf_counter() if instrumentation.enabled else None
         # decode the token ids into mapped tokens
         decoded = self._tokenizer.decode(ids)
+        if start is not None:
+            instrumentation.stage("tokenizer.wordpiece_decode", start, chars=len(decoded), tokens=len(ids))
         # denormalize the mapped tokens to indic language
         norm_text = self._mapper.decode(decoded)
+        if start is not None:
+            instrumentation.stage("tokenizer.decode", start, chars=len(norm_text), tokens=len(ids))
         return norm_text
     
+    def encode_batch(self, texts:list[str], lang="ta", num_workers:int=0, return_offsets:bool=False,
+                     return_arrays:str=None, dtype="int64"):
+        """
+        Encode a batch of texts with a single call to the base tokenizer.
+        :param texts: List of texts to encode.
+        :param lang: Language of the texts, or "auto" for mixed scripts (default is Tamil).
+        :param num_workers: Number of worker processes to map the texts with (default is 0, map in-process).
+        :param return_offsets: Also return the token offsets into the original texts.
+        :param return_arrays: Return numpy arrays instead of the encodings (needs numpy), "padded" for the input_ids
+                              and attention_mask of shape (batch, length), or "ragged" for the input_ids back to back
+                              with their offsets, along with the lengths of the sequences in both cases.
+        :param dtype: Integer dtype of the input_ids and attention_mask arrays, e.g. uint16 for the vocabularies up to 64K.
+        :return: List of encodings, padded and truncated as configured on the tokenizer,
+                 and the list of their original offsets if requested. Or the dict of the arrays.
+        """
+        if return_arrays is not None:
+            if return_offsets:
+                raise ValueError("the offsets are not returned along with the arrays")
+            dtype = _array_dtype(return_arrays, dtype, self._tokenizer.get_vocab_size())
+            return self.__arrays(self.encode_batch(texts, lang=lang, num_workers=num_workers), return_arrays, dtype)
+        start = perf_counter() if instrumentation.enabled else None
+        if start is not None:
+            instrumentation.gauge("tokenizer.batch_size", len(texts))
+            instrumentation.gauge("tokenizer.pool_size", num_workers if num_workers > 1 and len(texts) > num_workers else 0)
+        if num_workers > 1 and len(texts) > num_workers:
+            # hand over the texts to the workers in large chunks to keep the IPC low.
+            chunk_size = -(-len(texts) // (num_workers * 4))
+            chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+            mapped = [item for chunk in self.__pool(num_workers).map(partial(_map_texts, lang=lang, alignment=return_offsets), chunks)
+                      for item in chunk]
+        elif return_offsets:
+            mapped = [self._mapper.encode_with_alignment(text, lang=lang) for text in texts]
+        else:
+            mapped = [self._mapper.encode(text, lang=lang) for text in texts]
+
+        if start is not None:
+            instrumentation.stage("tokenizer.map_batch", start, chars=sum(map(len, texts)))
+        # the base tokenizer encodes the whole batch in parallel.
+        wordpiece = perf_counter() if instrumentation.enabled else None
+        encodings = self._tokenizer.encode_batch(mapped if not return_offsets else [text for (text, _) in mapped])
+        if start is not None:
+            tokens = sum(len(encoding.ids) for encoding in encodings)
+            instrumentation.stage("tokenizer.wordpiece_batch", wordpiece, tokens=tokens)
+            instrumentation.stage("tokenizer.encode_batch", start, chars=sum(map(len, texts)), tokens=tokens)
+        if not return_offsets:
+            return encodings
+        return encodings, [_original_offsets(encoding, alignment) for encoding, (_, alignment) in zip(encodings, mapped)]
+
+    def encode_buffer(self, buffer, offsets, lang="ta", return_arrays:str=None, dtype="int64"):
+        """
+        Encode the records of a buffer of utf-8 text, e.g. a message batch or a memory mapped file,
+        with a single call to the base tokenizer, same as encode_batch on the decoded records.
+        The records are mapped on their utf-8 bytes through views into the buffer, so the original texts
+        are neither copied nor decoded, and only the mapped texts are decoded for the base tokenizer.
+        :param buffer: Buffer of the records (bytes, bytearray, memoryview or mmap).
+        :param offsets: Byte offsets of the records into the buffer, with an extra trailing one for the end
+                        of the last record, as in the offsets index of the token shards (a list or a numpy array).
+        :param lang: Language of the texts, or "auto" for mixed scripts (default is Tamil).
+        :param return_arrays: Return numpy arrays instead of the encodings, "padded" or "ragged" (see encode_batch).
+        :param dtype: Integer dtype of the input_ids and attention_mask arrays.
+        :return: List of encodings, padded and truncated as configured on the tokenizer, or the dict of the arrays.
+        """
+        if return_arrays is not None:
+            dtype = _array_dtype(return_arrays, dtype, self._tokenizer.get_vocab_size())
+            return self.__arrays(self.encode_buffer(buffer, offsets, lang=lang), return_arrays, dtype)
+        start = perf_counter() if instrumentation.enabled else None
+        view = memoryview(buffer)
+        if view.ndim != 1 or view.itemsize != 1:
+            view = view.cast("B")
+        if len(offsets) < 1 or offsets[0] < 0 or offsets[-1] > len(view):
+            raise ValueError(f"the offsets should be within the buffer of {len(view)} bytes, with a trailing one for its end")
+
+        mapped = []
+        for begin, end in zip(offsets, offsets[1:]):
+            if end < begin:
+                raise ValueError(f"the offsets should not decrease, got {begin} then {end}")
+            mapped.append(self._mapper.encode_bytes(view[begin:end], lang=lang).decode("utf-8"))
+        if start is not None:
+            instrumentation.gauge("tokenizer.batch_size", len(mapped))
+            instrumentation.stage("tokenizer.map_buffer", start, chars=int(offsets[-1] - offsets[0]))
+        wordpiece = perf_counter() if instrumentation.enabled else None
+        encodings = self._tokenizer.encode_batch(mapped)
+        if start is not None:
+            tokens = sum(len(encoding.ids) for encoding in encodings)
+            instrumentation.stage("tokenizer.wordpiece_batch", wordpiece, tokens=tokens)
+            instrumentation.stage("tokenizer.encode_buffer", start, chars=int(offsets[-1] - offsets[0]), tokens=tokens)
+        return encodings
+
+    # turn the encodings of a batch into numpy arrays.
+    def __arrays(self, encodings:list, arrays:str, dtype) -> dict:
+        start = perf_counter() if instrumentation.enabled else None
+        result = _to_arrays(encodings, arrays, dtype, self._tokenizer.token_to_id(self.__pad_token),
+                            padded=self._tokenizer.padding is not None)
+        if start is not None:
+            instrumentation.stage("tokenizer.to_arrays", start, tokens=int(result["lengths"].sum()))
+        return result
+
+    def decode_batch(self, sequences:list[list[int]], skip_special_tokens:bool=True) -> list[str]:
+        """
+        Decode a batch of token id sequences.
+        :param sequences: List of token id lists.
+        :param skip_special_tokens: Whether to drop the special tokens from the output.
+        :return: List of decoded texts.
+        """
+        start = perf_counter() if instrumentation.enabled else None
+        decoded = self._tokenizer.decode_batch(sequences, skip_special_tokens=skip_special_tokens)
+        if start is not None:
+            tokens = sum(map(len, sequences))
+            instrumentation.gauge("tokenizer.batch_size", len(sequences))
+            instrumentation.stage("tokenizer.wordpiece_decode_batch", start, chars=sum(map(len, decoded)), tokens=tokens)
+        texts = [self._mapper.decode(text) for text in decoded]
+        if start is not None:
+            instrumentation.stage("tokenizer.decode_batch", start, chars=sum(map(len, texts)), tokens=tokens)
+        return texts
+
+    def incremental_decoder(self, skip_special_tokens:bool=True) -> IncrementalDecoder:
+        """
+        Get a decoder for the token ids of a sequence as they arrive, e.g. while generating.
+        The text it returns step by step adds up to decode(ids).
+        :param skip_special_tokens: Whether to drop the special tokens from the output.
+        """
+        skip_ids = [self._tokenizer.token_to_id(token) for token in self.__special_tokens] if skip_special_tokens else []
+        return IncrementalDecoder(self._tokenizer, self._mapper, skip_ids)
+
+    def enable_padding(self, direction:str="right", pad_to_multiple_of:int=None, length:int=None):
+        """
+        Pad the encodings with the [pad] token, to the longest in the batch unless a length is given.
+        """
+        self._tokenizer.enable_padding(direction=direction, pad_to_multiple_of=pad_to_multiple_of,
+                                       pad_id=self._tokenizer.token_to_id(self.__pad_token),
+                                       pad_token=self.__pad_token, length=length)
+
+    def no_padding(self):
+        self._tokenizer.no_padding()
+
+    def enable_truncation(self, max_length:int, stride:int=0, strategy:str="longest_first"):
+        """
+        Truncate the encodings to max_length tokens (special tokens included).
+        """
+        self._tokenizer.enable_truncation(max_length, stride=stride, strategy=strategy)
+
+    def no_truncation(self):
+        self._tokenizer.no_truncation()
+
+    # get the worker pool, (re)created for the requested size.
+    def __pool(self, num_workers:int):
+        if self._pool is None or self._pool_size != num_workers:
+            self.close()
+            self._pool = multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(self._mapper,))
+            self._pool_size = num_workers
+        return self._pool
+
+    def close(self):
+        """
+        Release the worker pool used for the batch mapping.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._pool_size = 0
+
+    def to_tokenizer(self, lang="ta") -> Tokenizer:
+        """
+        Build a standalone tokenizer with the grapheme mapping embedded in its normalizer and decoder.
+        It tokenizes the raw Indic text and decodes back to it fully in Rust, without the Python mapper,
+        into the token ids encode gives (see export for the exceptions).
+        :param lang: Language of the normalization rules, or "auto" for mixed scripts (default is Tamil).
+        :return: tokenizers.Tokenizer instance.
+        """
+        tokenizer = Tokenizer.from_str(self._tokenizer._tokenizer.to_str())
+        alphabet = set("".join(self._tokenizer.get_vocab().keys()))
+        reverse = dict(self._mapper.decode_rules())
+        placeholder = self.__placeholder
+        if placeholder in alphabet:
+            raise ValueError(f"the vocabulary holds the placeholder {placeholder!r}, the mapping cannot be embedded")
+
+        # the rules are the replacements, the graphemes and the dropped characters, in this order.
+        rules = self._mapper.encode_rules(lang)
+        first = next(index for index, (_, content) in enumerate(rules) if content in reverse)
+        replacements = rules[:first]
+        graphemes = {pattern: content for (pattern, content) in rules if content in reverse}
+        dropped = {pattern for (pattern, _) in rules[first + len(graphemes):]}
+        # the graphemes are a lead character followed by one or two vowel signs, which never lead themselves.
+        tails = {}
+        for pattern in graphemes:
+            tails.setdefault(pattern[1:], set()).add(pattern[0])
+        signs = sorted(set("".join(tails)))
+        pairs = sorted(tail for tail in tails if len(tail) == 2)
+        leads = {pattern[0] for pattern in graphemes}
+        if leads & set(signs) or any(len(tail) > 2 for tail in tails) or any(len(lead.encode("utf-8")) > 3 for lead in leads):
+            raise ValueError("the graphemes of the mapping table are not a lead and its vowel signs, the mapping cannot be embedded")
+
+        # the Precompiled normalizer maps the text in a single pass, but it looks up a grapheme cluster as a whole
+        # only below 6 bytes, and two Indic characters take 6. so the vowel signs (and the pairs of them) are
+        # turned into two byte combining marks first, followed by a control character that ends the cluster,
+        # and a lead with its mark is then looked up as a whole. the real marks and control character of the
+        # text are replaced with the placeholder up front: none of them is in the vocabulary, so the word
+        # holding them becomes [unk] either way. so does a word holding a grapheme missing from it.
+        marks = [chr(cp) for cp in range(0x300, 0x800) if unicodedata.category(chr(cp)) in ("Mn", "Me") and chr(cp) not in alphabet]
+        breaker = next((chr(cp) for cp in chain(range(0x1, 0x9), range(0xE, 0x1C)) if chr(cp) not in alphabet), None)
+        if len(marks) < len(signs) + len(pairs) or breaker is None:
+            raise ValueError("the vocabulary holds too many combining marks or control characters, the mapping cannot be embedded")
+        mark = dict(zip(signs + pairs, marks))
+
+        steps = [normalizers.Replace(Regex("[" + "".join(f"\\x{{{ord(c):x}}}" for c in marks + [breaker]) + "]"), placeholder)]
+        steps += [normalizers.Replace(pattern, content) for (pattern, content) in replacements]
+        # a pair of vowel signs is a single mark right after a lead it goes with, where the longest match takes it.
+        steps += [normalizers.Replace(Regex(f"(?<=[{''.join(sorted(tails[pair]))}]){re.escape(pair)}"), mark[pair] + breaker)
+                  for pair in pairs]
+        signs_to_marks = {sign: mark[sign] + breaker for sign in signs}
+        signs_to_marks.update((char, "") for char in dropped if char not in mark)
+        # a cluster holding a prepended character, as the dot reph, runs on into the next one and would be
+        # replaced as a whole, so those characters are replaced on their own.
+        charsmap = normalizers.Precompiled(self._mapper.precompiled_charsmap(signs_to_marks))
+        glued = sorted(char for char, content in signs_to_marks.items() if charsmap.normalize_str(char + " ") != content + " ")
+        steps += [normalizers.Replace(char, signs_to_marks.pop(char)) for char in glued]
+        steps.append(normalizers.Precompiled(self._mapper.precompiled_charsmap(signs_to_marks)))
+        # a lead with its mark is the mapped grapheme, a mark on its own the vowel signs it stands for,
+        # unless they are dropped, as the orphaned virama.
+        marks_to_graphemes = {pattern[0] + mark[pattern[1:]]: content if content in alphabet else placeholder
+                              for pattern, content in graphemes.items()}
+        marks_to_graphemes.update((mark[unit], "" if unit in dropped else unit) for unit in signs + pairs)
+        marks_to_graphemes[breaker] = ""
+        steps.append(normalizers.Precompiled(self._mapper.precompiled_charsmap(marks_to_graphemes)))
+
+        # the mapping runs before the BERT normalizer, just like the Python mapper does.
+        tokenizer.normalizer = normalizers.Sequence(steps + [tokenizer.normalizer])
+        # the word pieces are joined first and then mapped back.
+        tokenizer.decoder = decoders.Sequence([tokenizer.decoder] +
+                                              [decoders.Replace(mapped, original) for mapped, original in reverse.items() if mapped in alphabet])
+        return tokenizer
+
+    def export(self, path:str, lang="ta") -> str:
+        """
+        Save a self-contained tokenizer.json with the grapheme mapping embedded (see to_tokenizer).
+        The ids differ from encode only for a word holding a combining mark or control character of the vocabulary,
+        or a prepended character right before a consonant, and it encodes about 1.6 times slower than encode.
+        It can be loaded with tokenizers.Tokenizer.from_file or PreTrainedTokenizerFast(tokenizer_file=path).
+        :param path: Path of the json file to write.
+        :param lang: Language of the normalization rules, or "auto" for mixed scripts (default is Tamil).
+        :return: The path written.
+        """
+        self.to_tokenizer(lang).save(path)
+        return path
+
+    def fingerprint(self, lang="ta") -> str:
+        """
+        Get a hash of everything the token ids of the text depend on, to key the caches of the tokenized data with:
+        the base tokenizer (vocabulary, normalizer, pre-tokenizer, post-processor, padding and truncation),
+        the mapping table and the normalization rules of the language.
+        :param lang: Language of the text, or "auto" for mixed scripts (default is Tamil).
+        :return: Hex digest of the tokenizer.
+        """
+        digest = hashlib.sha256()
+        digest.update(self._tokenizer._tokenizer.to_str().encode("utf-8"))
+        digest.update(self._mapper.table_hash.encode("ascii"))
+        digest.update(json.dumps(self._mapper.encode_rules(lang), ensure_ascii=False).encode("utf-8"))
+        return digest.hexdigest()
+
     # method to decode the unicode mapping for strings.
     def decode_string(self, text:str):
         return self._mapper.decode(text)
@@ -0,0 +1,49 @@
+# @license: MIT License
+# description: A bounded cache of the token ids of the words, used by the tokenizer.
+
+from collections import OrderedDict
+
+class EncodeCache:
+    """
+    A bounded cache mapping the (mapped) words to their token ids.
+    The least recently used words are evicted once the cache is full, and the hits and misses are counted.
+    """
+    def __init__(self, max_size:int):
+        if max_size <= 0:
+            raise ValueError(f"the cache size should be positive, {max_size=}")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries = OrderedDict()
+
+    # get the token ids of a word, None if it is not cached.
+    def get(self, word:str):
+        ids = self.__entries.get(word)
+        if ids is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__entries.move_to_end(word)
+        return ids
+
+    # cache the token ids of a word, evicting the least recently used one if full.
+    def put(self, word:str, ids:tuple[int, ...]):
+        self.__entries[word] = ids
+        self.__entries.move_to_end(word)
+        if len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.__entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    # the counters as a dict.
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"size": len(self.__entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,76 @@
+# @license: MIT License
+# description: Incremental decoding of the token ids as they are generated, one grapheme cluster at a time.
+
+import unicodedata
+
+# the characters that join the grapheme clusters on either side of them into one.
+_joiners = frozenset(["\u200c", "\u200d"] + [chr(c) for c in range(0x0900, 0x0E00) if unicodedata.name(chr(c), "").endswith(" SIGN VIRAMA")])
+
+# get the start of the last grapheme cluster of the text, which the next token could still extend.
+def _last_cluster(text:str) -> int:
+    index = len(text)
+    while index > 0:
+        # the combining marks belong to the base character before them.
+        while index > 0 and unicodedata.category(text[index - 1]).startswith("M"):
+            index -= 1
+        if index > 0:
+            index -= 1
+        # a cluster joined by a virama or a zero width (non) joiner goes on to the previous base.
+        if index > 0 and text[index - 1] in _joiners:
+            index -= 1
+            continue
+        break
+    return index
+
+class IncrementalDecoder:
+    """
+    Decode the token ids as they arrive, returning only the newly decoded text on each step.
+    Every step decodes the new ids along with the previous token as an anchor, so the WordPiece
+    continuations (##) get joined to it and the words get separated as in the full decode,
+    at a cost in the number of the new ids rather than the length of the sequence.
+    The trailing grapheme cluster is held back until it is complete, so a half grapheme is never emitted.
+    """
+    def __init__(self, tokenizer, mapper=None, skip_ids=()):
+        """
+        :param tokenizer: Base tokenizer with decode(ids, skip_special_tokens=False), e.g. tokenizers.Tokenizer.
+        :param mapper: IndicUnicodeMapper to decode the mapped text with, None if the tokenizer decodes to the original text.
+        :param skip_ids: Token ids to drop, e.g. the special tokens.
+        """
+        self.__tokenizer = tokenizer
+        self.__mapper = mapper
+        self.__skip_ids = frozenset(skip_ids)
+        self.__anchor = None
+        self.__pending = ""
+
+    def __decode(self, ids:list[int]) -> str:
+        text = self.__tokenizer.decode(ids, skip_special_tokens=False)
+        return self.__mapper.decode(text) if self.__mapper is not None else text
+
+    def step(self, ids:list[int]) -> str:
+        """
+        Decode the next token ids.
+        :param ids: List of the new token ids.
+        :return: The newly completed text, possibly empty.
+        """
+        ids = [i for i in ids if i not in self.__skip_ids]
+        if not ids:
+            return ""
+        if self.__anchor is None:
+            text = self.__decode(ids)
+        else:
+            # the anchor decodes to the same text whatever follows it, so the rest is the new text.
+            text = self.__decode([self.__anchor] + ids)[len(self.__decode([self.__anchor])):]
+        self.__anchor = ids[-1]
+
+        text = self.__pending + text
+        split = _last_cluster(text)
+        self.__pending = text[split:]
+        return text[:split]
+
+    def flush(self) -> str:
+        """
+        Get the text held back at the end of the sequence.
+        """
+        text = self.__pending
+        self.__pending = ""
+        return text
@@ -3,7 +3,57 @@
 # description: This module provides a mapping between Indic Unicode characters and their corresponding representations.
 # @license: MIT License
 
-import pygtrie
+import re
+import io
+import os
+import struct
+import hashlib
+from types import MappingProxyType
+from .instrumentation import instrumentation
+from time import perf_counter
+
+# lay out the byte trie of the keys as the double array of darts-clone, which the sentencepiece charsmaps use.
+# the unit of a node holds its label in the low byte, a has-leaf flag at bit 8 and the offset from bit 10,
+# the children of the node at q with the offset o sit at q ^ o ^ label, and its value (with bit 31 set) at q ^ o.
+def _double_array(entries:dict[bytes, int]) -> list[int]:
+    trie = {}
+    for key, value in entries.items():
+        node = trie
+        for byte in key:
+            node = node.setdefault(byte, {})
+        node[None] = value
+    units = [0] * 256
+    used = {0}
+    bases = set()
+    # the lowest free unit, where the search for the place of a node with a single slot starts,
+    # and the place of the last node with several of them, where the search for the next one starts.
+    (free, wide) = (1, 1)
+    pending = [(trie, 0)]
+    while pending:
+        (node, position) = pending.pop()
+        labels = [label for label in node if label is not None]
+        slots = ([0] if None in node else []) + labels
+        while free in used or free in bases:
+            free += 1
+        # the offsets are unique, so that a label never leads into the children of another node.
+        first = free if len(slots) == 1 else max(free, wide)
+        while (base := first ^ slots[0]) in bases or base == 0 or any(base ^ label in used for label in slots):
+            first += 1
+        if len(slots) > 1:
+            wide = first
+        if position ^ base >= 1 << 21:
+            raise ValueError("the charsmap is too large for the double array")
+        bases.add(base)
+        used.update(base ^ label for label in slots)
+        while len(units) <= base | 0xFF:
+            units.extend([0] * 256)
+        units[position] |= ((position ^ base) << 10) | ((1 << 8) if None in node else 0)
+        if None in node:
+            units[base] = (1 << 31) | node[None]
+        for label in labels:
+            units[base ^ label] = label
+            pending.append((node[label], base ^ label))
+    return units
 
 class IndicUnicodeMapper:
     """
@@ -31,9 +81,21 @@ class IndicUnicodeMapper:
     __start_unicode = 0xE001
     # max grapheme length for a language
     __max_length = {"ta":3, "ml":3}
+    # the pseudo language for mixed script text, which applies the rules of each language
+    # to the runs of its own script.
+    __auto = "auto"
+
+    # the mapping tables shared by all the instances, built once per process on first use
+    # (keyed by the table file they were loaded from, None for the built-in ones).
+    # they are read-only (only the compiled engines get added), so the forked workers
+    # inherit them copy-on-write without rebuilding.
+    __shared = {}
 
-    # cache of language specific vowels.
-    __all_vowels = {}
+    # the binary table file starts with a header of the magic, the format version and
+    # the sha256 digest of the payload that follows, which serves as the table version.
+    __table_magic = b"IUMT"
+    __table_format = 1
+    __table_header = struct.Struct("<4sHH32s")
 
     # get the letters for a language
     # this is used to get the letters for a language
@@ -57,13 +119,16 @@ class IndicUnicodeMapper:
 
         return letters
 
-    def __init__(self):
-        self.__forward = pygtrie.CharTrie()
-        self.__reverse = {}
+    # build the forward and reverse tables, and the language specific vowels.
+    @classmethod
+    def __build_tables(cls) -> tuple:
+        forward = {}
+        reverse = {}
+        all_vowels = {}
 
-        _index = self.__start_unicode
-        for lang in self.__indic_languages:
-            (v, c, _) = self.__indic_symbols[lang]
+        _index = cls.__start_unicode
+        for lang in cls.__indic_languages:
+            (v, c, _) = cls.__indic_symbols[lang]
             for _c in c:
                 for _v in v:
                     _s = _c
@@ -73,8 +138,8 @@ class IndicUnicodeMapper:
                         _s += _v
                     # convert the unicode index into an unicode character
                     mapped_unicode = chr(_index)
-                    self.__forward[_s] = mapped_unicode
-                    self.__reverse[mapped_unicode] = _s
+                    forward[_s] = mapped_unicode
+                    reverse[mapped_unicode] = _s
                     _index += 1
             # create a cache of vowels
             cache = set()
@@ -85,7 +150,136 @@ class IndicUnicodeMapper:
                 else:
                     cache.add(v_)
             # populate the language specific vowels
-            self.__all_vowels[lang] = cache
+            all_vowels[lang] = frozenset(cache)
+
+        replacements = {lang: MappingProxyType(dict(cls.__indic_symbols[lang][2])) for lang in cls.__indic_languages}
+        # the compiled encoding engines are added to the last one, lazily per language.
+        return MappingProxyType(forward), MappingProxyType(reverse), MappingProxyType(all_vowels), MappingProxyType(replacements), {}
+
+    # serialize the tables into the payload of the binary table file.
+    # all the integers are little endian uint32 and the characters are stored as UTF-32-LE.
+    @staticmethod
+    def __pack_tables(forward, reverse, all_vowels, replacements) -> bytes:
+        start = min(map(ord, reverse.keys()))
+        langs = list(all_vowels.keys())
+        keys = [reverse[chr(start + i)] for i in range(len(reverse))]
+        payload = [struct.pack("<III", start, len(keys), len(langs))]
+        for lang in langs:
+            vowels = "".join(sorted(all_vowels[lang]))
+            payload.append(struct.pack("<4sII", lang.encode("ascii"), len(vowels), len(replacements[lang])))
+            payload.append(vowels.encode("utf-32-le"))
+            for item, replacement in replacements[lang].items():
+                payload.append(struct.pack("<II", len(item), len(replacement)))
+                payload.append((item + replacement).encode("utf-32-le"))
+        # the reverse table, the grapheme of the mapped character start + i at the slot i,
+        # padded to 3 characters. the forward table is its inverse.
+        payload.append(bytes(map(len, keys)))
+        payload.append("".join(key.ljust(3, "\0") for key in keys).encode("utf-32-le"))
+        return b"".join(payload)
+
+    # load the tables from the binary table file.
+    # they are turned into dicts anyway, so the file is read as a whole rather than memory mapped.
+    @classmethod
+    def __load_tables(cls, path:str) -> tuple:
+        with open(path, "rb") as fh:
+            data = fh.read()
+            fh.close()
+        (magic, version, _, digest) = cls.__table_header.unpack_from(data, 0)
+        if magic != cls.__table_magic or version != cls.__table_format:
+            raise ValueError(f"{path} is not a mapping table of format {cls.__table_format}")
+        offset = cls.__table_header.size
+        if hashlib.sha256(data[offset:]).digest() != digest:
+            raise ValueError(f"{path} is corrupt, its digest does not match")
+
+        # read a number of characters at the current offset.
+        def chars(count:int) -> str:
+            nonlocal offset
+            text = data[offset:offset + 4 * count].decode("utf-32-le")
+            offset += 4 * count
+            return text
+
+        (start, count, nlangs) = struct.unpack_from("<III", data, offset)
+        offset += 12
+        all_vowels = {}
+        replacements = {}
+        for _ in range(nlangs):
+            (lang, nvowels, nreplacements) = struct.unpack_from("<4sII", data, offset)
+            offset += 12
+            lang = lang.rstrip(b"\0").decode("ascii")
+            all_vowels[lang] = frozenset(chars(nvowels))
+            replacements[lang] = {}
+            for _ in range(nreplacements):
+                (nitem, nreplacement) = struct.unpack_from("<II", data, offset)
+                offset += 8
+                item = chars(nitem)
+                replacements[lang][item] = chars(nreplacement)
+            replacements[lang] = MappingProxyType(replacements[lang])
+        lengths = data[offset:offset + count]
+        offset += count
+        slots = chars(3 * count)
+
+        reverse = {chr(start + i): slots[3 * i:3 * i + lengths[i]] for i in range(count)}
+        forward = {key: mapped for mapped, key in reverse.items()}
+        return MappingProxyType(forward), MappingProxyType(reverse), MappingProxyType(all_vowels), MappingProxyType(replacements), {}
+
+    # table_path: optional binary table file (see save_table) to load, instead of building the tables.
+    def __init__(self, table_path:str=None):
+        key = os.path.realpath(table_path) if table_path is not None else None
+        if key not in IndicUnicodeMapper.__shared:
+            start = perf_counter() if instrumentation.enabled else None
+            IndicUnicodeMapper.__shared[key] = self.__load_tables(key) if key is not None else self.__build_tables()
+            if start is not None:
+                instrumentation.stage("mapper.load_tables" if key is not None else "mapper.build_tables", start)
+        elif instrumentation.enabled:
+            instrumentation.count("mapper.shared_table_hits")
+        # the instances only refer to the shared tables.
+        (self.__forward, self.__reverse, self.__all_vowels, self.__replacements, self.__engines) = IndicUnicodeMapper.__shared[key]
+        self.__table_path = key
+
+    # the instances have no state of their own, so they get pickled by reference to their tables.
+    def __reduce__(self):
+        return (self.__class__, (self.__table_path,))
+
+    # save the tables into a binary table file, returning its version hash.
+    def save_table(self, path:str) -> str:
+        payload = self.__pack_tables(self.__forward, self.__reverse, self.__all_vowels, self.__replacements)
+        digest = hashlib.sha256(payload).digest()
+        with open(path, "wb") as fw:
+            fw.write(self.__table_header.pack(self.__table_magic, self.__table_format, 0, digest))
+            fw.write(payload)
+            fw.close()
+        return digest.hex()
+
+    # the version hash of the tables in use.
+    @property
+    def table_hash(self) -> str:
+        payload = self.__pack_tables(self.__forward, self.__reverse, self.__all_vowels, self.__replacements)
+        return hashlib.sha256(payload).hexdigest()
+
+    # read the version hash of a binary table file, without loading it.
+    @classmethod
+    def read_table_hash(cls, path:str) -> str:
+        with open(path, "rb") as fh:
+            (magic, version, _, digest) = cls.__table_header.unpack(fh.read(cls.__table_header.size))
+            fh.close()
+        if magic != cls.__table_magic or version != cls.__table_format:
+            raise ValueError(f"{path} is not a mapping table of format {cls.__table_format}")
+        return digest.hex()
+
+    # compile the (text, replacement) rules into the precompiled charsmap of a sentencepiece normalizer,
+    # as taken by tokenizers.normalizers.Precompiled: the size of the double array trie over the utf-8 bytes
+    # of the texts, the trie with the offsets of their replacements as the values, and the nul terminated replacements.
+    # the normalizer looks up a whole grapheme cluster only if it is shorter than 6 bytes, and then replaces
+    # all of it with the shortest text matching its start; otherwise it looks up its characters one by one.
+    @staticmethod
+    def precompiled_charsmap(rules:dict[str, str]) -> bytes:
+        entries = {}
+        replacements = io.BytesIO()
+        for text, replacement in rules.items():
+            entries[text.encode("utf-8")] = replacements.tell()
+            replacements.write(replacement.encode("utf-8") + b"\0")
+        units = _double_array(entries)
+        return struct.pack(f"<I{len(units)}I", 4 * len(units), *units) + replacements.getvalue()
 
     # create the normalization and denormalization tsv file for sentencepiece tokenizer
     def generate_norm_rule_tsv(self, path:str):
@@ -108,38 +302,326 @@ class IndicUnicodeMapper:
             fn.close()
         return True
 
+    # get the ordered (pattern, replacement) rules that reproduce encode with plain
+    # search and replace, applied one after the other over the whole text.
+    # the graphemes start with a consonant followed by vowel signs only, so two of them
+    # never overlap and replacing the longer ones first gives the longest match.
+    def encode_rules(self, lang="ta") -> list[tuple[str, str]]:
+        rules = list(self.__replacements_of(lang).items())
+        rules += sorted(((key, self.__forward[key]) for key in self.__reverse.values()), key=lambda r: len(r[0]), reverse=True)
+        # the orphaned virama goes last.
+        rules.append(('\u0bcd', ""))
+        return rules
+
+    # get the (mapped, original) rules that reproduce decode.
+    def decode_rules(self) -> list[tuple[str, str]]:
+        return list(self.__reverse.items())
+
     # check if the given text contains language vowels.
     # if return value is positive (position of the problem), the text is deemed inconsistent
     def is_consistent(self, text:str, lang="ta") -> int:
-        if lang not in self.__all_vowels:
+        if lang == self.__auto:
+            vowels = frozenset().union(*self.__all_vowels.values())
+        elif lang in self.__all_vowels:
+            vowels = self.__all_vowels[lang]
+        else:
             raise ValueError(f"unknown language {lang=}")
         
         # scan through the text for left out vowels.
         # stop on the first find.
         for index, symbol in enumerate(text):
-            if symbol in self.__all_vowels[lang]:
+            if symbol in vowels:
                 return index
         # all good here.
         return -1
     
     # replace broken strings into correct formats
     def __normalize(self, text:str, lang="ta") -> str:
-        if lang not in self.__all_vowels:
-            raise ValueError(f"unknown language {lang=}")
-        
+        start = perf_counter() if instrumentation.enabled else None
         # fetch the replacements for the language
-        replacements = self.__indic_symbols[lang][2]
+        replacements = self.__replacements_of(lang)
 
         # replace the broken vowels with correct ones
         for item in replacements.keys():
             text = text.replace(item, replacements[item])
 
+        if start is not None:
+            instrumentation.stage("mapper.normalize", start, chars=len(text))
         # return the normalized text
         return text
  
+    # get the replacements of a language.
+    # for auto, the replacements of all the languages are applied together over the whole text.
+    # that is the same as applying them run by run only if the replacements of each language
+    # stay within the unicode blocks of its own vowels, and no two languages share a block,
+    # so that a replacement can never match or produce anything outside the runs of its script.
+    def __replacements_of(self, lang) -> dict:
+        if lang != self.__auto:
+            if lang not in self.__replacements:
+                raise ValueError(f"unknown language {lang=}")
+            return self.__replacements[lang]
+
+        merged = {}
+        taken = set()
+        for language, replacements in self.__replacements.items():
+            blocks = {ord(vowel) >> 7 for vowel in self.__all_vowels[language]}
+            if blocks & taken or any(ord(c) >> 7 not in blocks for item in replacements.items() for c in "".join(item)):
+                raise ValueError(f"the replacements of {language=} are not confined to its script, auto is not supported")
+            taken |= blocks
+            merged.update(replacements)
+        return merged
+
+    # check if the needle overlaps the haystack on either side or is contained in it.
+    @staticmethod
+    def __overlaps(needle:str, haystack:str, proper:bool=False) -> bool:
+        if needle != haystack and (needle in haystack or haystack in needle):
+            return True
+        # a string always overlaps itself fully, so only look at proper overlaps then.
+        limit = min(len(needle), len(haystack)) - (1 if proper else 0)
+        for k in range(1, limit + 1):
+            if needle[-k:] == haystack[:k] or haystack[-k:] == needle[:k]:
+                return True
+        return False
+
+    # check if the replacements of a language can be applied inline while scanning
+    # for graphemes, giving the same output as replacing them all up front.
+    def __foldable(self, replacements:dict) -> bool:
+        if not replacements:
+            return True
+        keys = self.__reverse.values()
+        # the proper prefixes and suffixes of the graphemes, and the text strictly inside them.
+        prefixes = {key[:j] for key in keys for j in range(1, len(key))}
+        suffixes = {key[j:] for key in keys for j in range(1, len(key))}
+        inner = {key[j:k] for key in keys for j in range(1, len(key)) for k in range(j + 1, len(key))}
+        for pattern, output in replacements.items():
+            # the replacements should not interfere with each other.
+            for other in replacements.keys():
+                if self.__overlaps(pattern, other, proper=(pattern == other)):
+                    return False
+            for other in replacements.values():
+                if self.__overlaps(other, pattern):
+                    return False
+            # the mapping of the replaced text should not depend on its neighbours:
+            # no grapheme may end inside it, hold it inside, or start inside it and run past it.
+            if not output or output in inner or any(output[:k] in suffixes for k in range(1, len(output) + 1)):
+                return False
+            if any(output[j:] in prefixes for j in range(len(output))):
+                return False
+        return True
+
+    # compile the forward table, the replacements and the virama dropping
+    # into a single alternation over the text, or over its utf-8 bytes.
+    def __compile(self, replacements:dict, utf8:bool=False) -> tuple:
+        # matched text to its mapped text.
+        table = {}
+        # alternatives in the order of priority, along with their negative lookaheads.
+        alternatives = []
+        if replacements:
+            plain = self.__engine(None)
+            for pattern, output in replacements.items():
+                # the replaced text is mapped on its own, it does not interact with the neighbours.
+                table[pattern] = self.__encode_with(output, plain)
+                alternatives.append((pattern, []))
+
+        # longest graphemes first to get the longest match.
+        for key in sorted(self.__reverse.values(), key=len, reverse=True):
+            lookaheads = []
+            for pattern in replacements.keys():
+                for j in range(len(key)):
+                    tail = key[j:]
+                    if tail.startswith(pattern):
+                        # the replacement falls inside the grapheme, which can never be seen.
+                        lookaheads = None
+                        break
+                    if pattern.startswith(tail):
+                        # the replacement starts inside the grapheme and runs past it.
+                        lookaheads.append(pattern[len(tail):])
+                if lookaheads is None:
+                    break
+            if lookaheads is not None:
+                table[key] = self.__forward[key]
+                alternatives.append((key, lookaheads))
+
+        # the orphaned virama is dropped.
+        table['\u0bcd'] = ""
+        alternatives.append(('\u0bcd', []))
+
+        # group the alternatives by their leading character, so that the regex engine
+        # can skip over the unmapped text quickly.
+        groups = {}
+        for (text, lookaheads) in alternatives:
+            tail = re.escape(text[1:]) + "".join(f"(?!{re.escape(la)})" for la in lookaheads)
+            groups.setdefault(text[0], []).append(tail)
+        branches = []
+        for lead, tails in groups.items():
+            # an empty tail has to be the last choice in the group.
+            tails.sort(key=lambda t: t == "")
+            branches.append((lead, "(?:" + "|".join(tails) + ")"))
+
+        if not utf8:
+            # the consonants of a language take the same vowel signs, so their branches are merged
+            # into a character class per alternation of tails, which keeps the pattern quick to compile.
+            leads = {}
+            for (lead, tails) in branches:
+                leads.setdefault(tails, []).append(lead)
+            return re.compile("(" + "|".join(self.__char_class(chars) + tails for tails, chars in leads.items()) + ")"), table
+        # the leading characters of a script share their first bytes, so the branches are factored
+        # into a trie of those bytes, otherwise the regex engine would try them one after the other.
+        trie = {}
+        for (lead, tails) in branches:
+            node = trie
+            for byte in lead.encode("utf-8"):
+                node = node.setdefault(byte, {})
+            node[None] = tails.encode("utf-8")
+        def render(node:dict) -> bytes:
+            if None in node:
+                return node[None]
+            # the bytes leading to the same alternation are merged into a class, as in the text pattern.
+            children = {}
+            for byte, child in node.items():
+                children.setdefault(render(child), []).append(bytes([byte]))
+            return b"(?:" + b"|".join(self.__char_class(leads) + tails for tails, leads in children.items()) + b")"
+        table = {text.encode("utf-8"): mapped.encode("utf-8") for text, mapped in table.items()}
+        return re.compile(b"(" + render(trie) + b")"), table
+
+    # get the pattern matching any one of the characters (or of the bytes).
+    @staticmethod
+    def __char_class(chars:list):
+        if len(chars) == 1:
+            return re.escape(chars[0])
+        if isinstance(chars[0], bytes):
+            return b"[" + b"".join(map(re.escape, chars)) + b"]"
+        return "[" + "".join(map(re.escape, chars)) + "]"
+
+    # get the compiled encoding engine for a language.
+    # the engine of None is the plain grapheme alternation, without any replacements.
+    def __engine(self, lang) -> tuple:
+        if lang not in self.__engines:
+            start = perf_counter() if instrumentation.enabled else None
+            replacements = self.__replacements_of(lang) if lang is not None else {}
+            if self.__foldable(replacements):
+                self.__engines[lang] = (*self.__compile(replacements), True)
+            else:
+                self.__engines[lang] = (*self.__engine(None)[:2], False)
+            if start is not None:
+                instrumentation.stage("mapper.compile", start)
+        return self.__engines[lang]
+
+    # get the compiled engine of a language over the utf-8 bytes of the text.
+    def __bytes_engine(self, lang) -> tuple:
+        key = ("bytes", lang)
+        if key not in self.__engines:
+            (_, _, folded) = self.__engine(lang)
+            start = perf_counter() if instrumentation.enabled else None
+            replacements = self.__replacements_of(lang) if lang is not None and folded else {}
+            self.__engines[key] = (*self.__compile(replacements, utf8=True), folded)
+            if start is not None:
+                instrumentation.stage("mapper.compile", start)
+        return self.__engines[key]
+
+    # run the text through a compiled engine.
+    @staticmethod
+    def __encode_with(text:str, engine:tuple) -> str:
+        (pattern, table, _) = engine
+        # split gives the unmapped runs at the even positions and the matches at the odd ones.
+        parts = pattern.split(text)
+        parts[1::2] = map(table.__getitem__, parts[1::2])
+        return "".join(parts)
+
     # encode the supplied ucs-2 indic string into unicode mapped ucs-2 string
+    # with lang="auto", the text may mix the scripts, and each script run gets the rules of its own language
+    # in the same single pass, as the replacements of all the languages are folded into one engine.
     def encode(self, text:str, lang="ta"):
-        if lang not in self.__max_length:
+        if lang is None:
+            raise ValueError(f"unknown language {lang=}")
+
+        start = perf_counter() if instrumentation.enabled else None
+        engine = self.__engine(lang)
+        # the replacements could not be folded into the engine, apply them first.
+        if not engine[2]:
+            text = self.__normalize(text, lang=lang)
+
+        # a single pass over the text, the unmapped runs are copied through as they are.
+        mapped = self.__encode_with(text, engine)
+        if start is not None:
+            instrumentation.stage("mapper.encode", start, chars=len(text))
+        return mapped
+
+    # encode the utf-8 bytes of the indic text into the utf-8 bytes of the mapped text, same as
+    # encode(data.decode("utf-8")).encode("utf-8"), without decoding the text. the data can be any bytes-like
+    # object (bytes, bytearray, memoryview, mmap), so the slices of a larger buffer are mapped without copying them.
+    # the letters of the tamil and malayalam blocks are matched by their utf-8 sequences, as utf-8 never matches
+    # in the middle of a character, and everything else is copied through as it is.
+    def encode_bytes(self, data, lang="ta") -> bytes:
+        if lang is None:
+            raise ValueError(f"unknown language {lang=}")
+
+        start = perf_counter() if instrumentation.enabled else None
+        (pattern, table, folded) = self.__bytes_engine(lang)
+        # the replacements could not be folded into the engine, apply them first.
+        if not folded:
+            data = bytes(data)
+            for item, replacement in self.__replacements_of(lang).items():
+                data = data.replace(item.encode("utf-8"), replacement.encode("utf-8"))
+
+        parts = pattern.split(data)
+        parts[1::2] = map(table.__getitem__, parts[1::2])
+        # b"".join holds a buffer view of every part while joining, the stream only copies them in.
+        stream = io.BytesIO()
+        stream.writelines(parts)
+        mapped = stream.getvalue()
+        if start is not None:
+            # the bytes of the input are counted as its chars.
+            instrumentation.stage("mapper.encode_bytes", start, chars=len(data))
+        return mapped
+
+    # map the split parts (unmapped runs at the even positions and matches at the odd ones),
+    # tracking where each output character comes from.
+    @staticmethod
+    def __join_with_alignment(parts:list[str], table:dict) -> tuple[str, list[int]]:
+        output = []
+        alignment = []
+        position = 0
+        for index, part in enumerate(parts):
+            if index & 1:
+                mapped = table[part]
+                alignment.extend([position] * len(mapped))
+                output.append(mapped)
+            else:
+                alignment.extend(range(position, position + len(part)))
+                output.append(part)
+            position += len(part)
+        alignment.append(position)
+        return "".join(output), alignment
+
+    # encode the text along with the alignment of the mapped text to the original one,
+    # in the same pass. the mapped character i comes from text[alignment[i]:alignment[i+1]],
+    # and the alignment has an extra trailing entry for the length of the text.
+    def encode_with_alignment(self, text:str, lang="ta") -> tuple[str, list[int]]:
+        if lang is None:
+            raise ValueError(f"unknown language {lang=}")
+
+        start = perf_counter() if instrumentation.enabled else None
+        (pattern, table, folded) = self.__engine(lang)
+        steps = []
+        if not folded:
+            # the replacements are applied up front, one after the other, as in __normalize.
+            for item, replacement in self.__replacements_of(lang).items():
+                text, step = self.__join_with_alignment(re.split(f"({re.escape(item)})", text), {item: replacement})
+                steps.append(step)
+
+        mapped, alignment = self.__join_with_alignment(pattern.split(text), table)
+        # bring the alignment back to the original text through the replacements.
+        for step in reversed(steps):
+            alignment = [step[i] for i in alignment]
+        if start is not None:
+            instrumentation.stage("mapper.encode_with_alignment", start, chars=len(text))
+        return mapped, alignment
+
+    # the reference longest match encoder, probing the forward table at every position.
+    # kept around to verify and benchmark the compiled engine.
+    def encode_reference(self, text:str, lang="ta"):
+        if lang not in self.__max_length and lang != self.__auto:
             raise ValueError(f"unknown language {lang=}")
         
         # normalize the text to get rid of inconsistencies
@@ -148,7 +630,7 @@ class IndicUnicodeMapper:
         # get the length of the length
         length = len(text)
         # get the language specific chunk length
-        max_chunk_length = self.__max_length[lang]
+        max_chunk_length = self.__max_length.get(lang, max(self.__max_length.values()))
 
         # encode is a linear complexity algorithm
         # the hope is that the calling layer will use parallel processing.
@@ -175,4 +657,8 @@ class IndicUnicodeMapper:
     def decode(self, text:str):
         # decode is a linear complexity algorithm
         # the hope is that the calling layer will use parallel processing.
-        return "".join(map(lambda x: self.__reverse[x] if x in self.__reverse else x, text))
+        start = perf_counter() if instrumentation.enabled else None
+        decoded = "".join(map(lambda x: self.__reverse[x] if x in self.__reverse else x, text))
+        if start is not None:
+            instrumentation.stage("mapper.decode", start, chars=len(text))
+        return decoded
@@ -0,0 +1,149 @@
+# @license: MIT License
+# description: Opt-in per-stage timings and counters of the mapper and the tokenizer, as a snapshot or Prometheus text.
+
+import os
+import re
+import threading
+from time import perf_counter
+
+# the upper bounds of the stage durations, from 10us to 10s.
+STAGE_BOUNDS = [0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# the metric names allow letters, digits and underscores only.
+def _metric_name(name:str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+class Histogram:
+    """
+    A cumulative histogram over fixed upper bounds, in the Prometheus style.
+    """
+    def __init__(self, bounds:list[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value:float):
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name:str, labels:str="") -> list[str]:
+        """
+        Render the bucket, sum and count lines, with the given labels (e.g. 'stage="mapper.encode"') added to each.
+        """
+        lines = []
+        cumulative = 0
+        prefix = labels + "," if labels else ""
+        suffix = "{" + labels + "}" if labels else ""
+        for bound, count in zip(self.bounds + ["+Inf"], self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+class _Stage:
+    # the totals of a stage, and the histogram of its durations.
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.chars = 0
+        self.tokens = 0
+        self.durations = Histogram(STAGE_BOUNDS)
+
+class Instrumentation:
+    """
+    Per-stage durations, characters and tokens processed, counters (e.g. the cache hits) and gauges
+    (e.g. the pool sizes of build_model) of the mapper and the tokenizer.
+    It is disabled by default, and the instrumented code only checks the enabled flag before reading the clock,
+    so it costs next to nothing. Enable it with enable(), or with INDIC_TOKENIZER_INSTRUMENT=1 in the environment.
+    The work done in the worker processes is counted there, not in the parent.
+    """
+    def __init__(self, enabled:bool=False):
+        self.enabled = enabled
+        self.__lock = threading.Lock()
+        self.__stages = {}
+        self.__counters = {}
+        self.__gauges = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.__lock:
+            self.__stages.clear()
+            self.__counters.clear()
+            self.__gauges.clear()
+
+    def stage(self, name:str, start:float, chars:int=0, tokens:int=0):
+        """
+        Record a stage that ran from start (a perf_counter() time) until now, with the characters and tokens it processed.
+        """
+        seconds = perf_counter() - start
+        with self.__lock:
+            stage = self.__stages.get(name)
+            if stage is None:
+                stage = self.__stages[name] = _Stage()
+            stage.calls += 1
+            stage.seconds += seconds
+            stage.max_seconds = max(stage.max_seconds, seconds)
+            stage.chars += chars
+            stage.tokens += tokens
+            stage.durations.observe(seconds)
+
+    def count(self, name:str, value:int=1):
+        """
+        Add to a counter, e.g. of the cache hits.
+        """
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + value
+
+    def gauge(self, name:str, value:float):
+        """
+        Set a gauge to its latest value, e.g. the number of workers.
+        """
+        with self.__lock:
+            self.__gauges[name] = value
+
+    def snapshot(self) -> dict:
+        """
+        Get the recorded stages, counters and gauges as a dict.
+        """
+        with self.__lock:
+            stages = {name: {"calls": stage.calls, "seconds": stage.seconds, "max_seconds": stage.max_seconds,
+                             "chars": stage.chars, "tokens": stage.tokens}
+                      for name, stage in self.__stages.items()}
+            return {"enabled": self.enabled, "stages": stages, "counters": dict(self.__counters), "gauges": dict(self.__gauges)}
+
+    def prometheus(self, prefix:str="indic_tokenizer") -> str:
+        """
+        Get the recorded stages, counters and gauges in the Prometheus text format.
+        The stages are labelled by their name, and the counters and gauges get their names with the prefix.
+        """
+        with self.__lock:
+            stages = sorted(self.__stages.items())
+            lines = [f"# TYPE {prefix}_stage_seconds histogram"]
+            for name, stage in stages:
+                lines += stage.durations.render(f"{prefix}_stage_seconds", f'stage="{name}"')
+            for metric in ("chars", "tokens"):
+                lines.append(f"# TYPE {prefix}_stage_{metric}_total counter")
+                lines += [f'{prefix}_stage_{metric}_total{{stage="{name}"}} {getattr(stage, metric)}' for name, stage in stages]
+            for name, value in sorted(self.__counters.items()):
+                metric = f"{prefix}_{_metric_name(name)}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+            for name, value in sorted(self.__gauges.items()):
+                metric = f"{prefix}_{_metric_name(name)}"
+                lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+# the instrumentation shared by the mappers and the tokenizers of the process.
+instrumentation = Instrumentation(enabled=os.environ.get("INDIC_TOKENIZER_INSTRUMENT", "") == "1")
@@ -0,0 +1,96 @@
+# @license: MIT License
+# description: A persistent on-disk cache of the mapped corpus shards, used by the vocabulary builds.
+
+import hashlib
+import json
+import os
+
+class MappedShardCache:
+    """
+    A directory of mapped shards, keyed by the content hash of the input file, the byte range of the shard
+    and the version hash of the mapping table, so an unchanged file is never mapped twice with the same table.
+    The content hashes are remembered by the path, size and modification time of the files, so the unchanged
+    files are not even read again. Once the shards exceed max_bytes, the least recently used ones are evicted.
+    """
+    # the remembered content hashes of the input files.
+    __index_file = "files.json"
+
+    def __init__(self, cache_dir:str, max_bytes:int=None):
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError(f"the cache size should be positive, {max_bytes=}")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with open(os.path.join(cache_dir, self.__index_file), "r") as fh:
+                self.__hashes = json.load(fh)
+                fh.close()
+        except (OSError, ValueError):
+            self.__hashes = {}
+
+    # the content hash of a file, read afresh only if the file changed since it was last hashed.
+    def file_hash(self, path:str) -> str:
+        stat = os.stat(path)
+        key = os.path.realpath(path)
+        known = self.__hashes.get(key)
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return known[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as fh:
+            while chunk := fh.read(1 << 20):
+                digest.update(chunk)
+            fh.close()
+        self.__hashes[key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    # the path of the mapped shard of a byte range of a file, mapped with the given table.
+    def shard_path(self, file_hash:str, start:int, end:int, table_hash:str) -> str:
+        key = hashlib.sha256(f"{file_hash}:{start}:{end}:{table_hash}".encode("ascii")).hexdigest()
+        return os.path.join(self.cache_dir, key + ".txt")
+
+    # check if a mapped shard is cached, marking it as recently used.
+    def lookup(self, path:str) -> bool:
+        if not os.path.isfile(path):
+            return False
+        os.utime(path)
+        return True
+
+    def save(self):
+        """
+        Save the remembered content hashes.
+        """
+        tmp = os.path.join(self.cache_dir, self.__index_file + ".tmp")
+        with open(tmp, "w") as fw:
+            json.dump(self.__hashes, fw)
+            fw.close()
+        os.replace(tmp, os.path.join(self.cache_dir, self.__index_file))
+
+    def evict(self, keep:set=frozenset()) -> list[str]:
+        """
+        Delete the least recently used shards until the cache fits in max_bytes, except the ones to keep.
+        :return: List of the deleted shards.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".txt") and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for (_, size, _) in entries)
+        evicted = []
+        if self.max_bytes is None:
+            return evicted
+        for (_, size, path) in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            os.remove(path)
+            total -= size
+            evicted.append(path)
+        return evicted
+
+    def size(self) -> int:
+        """
+        Get the total size of the cached shards in bytes.
+        """
+        return sum(entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.name.endswith(".txt") and entry.is_file())
@@ -0,0 +1,174 @@
+# @license: MIT License
+# description: Pre-tokenized corpora stored as flat binary token shards, read back through numpy.memmap.
+
+import json
+import os
+from .logger import get_logger
+
+# numpy is only needed for the token shards, install it with the shards extra.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = get_logger("token_shards")
+
+# the metadata of the shards in a directory.
+INDEX_FILE = "index.json"
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("the token shards need numpy, install it with: pip install indic_tokenizer[shards]")
+
+# the smallest unsigned dtype holding all the token ids of the vocabulary.
+def _token_dtype(vocab_size:int) -> str:
+    return "uint16" if vocab_size <= 1 << 16 else "uint32"
+
+def write_id_shards(sequences, out_dir:str, vocab_size:int, shard_tokens:int=64*1024*1024, **metadata) -> dict:
+    """
+    Write the token id sequences into flat binary shards with an offsets index.
+    Each shard-NNNNN.bin holds the ids of its sequences back to back (uint16, or uint32 for the vocabularies over 64K),
+    and shard-NNNNN.idx the uint64 offsets of the sequences into it, with an extra trailing one for its end.
+    :param sequences: Iterable of the token id sequences.
+    :param out_dir: Directory to write the shards and their index.json into.
+    :param vocab_size: Size of the vocabulary the ids come from.
+    :param shard_tokens: Number of tokens after which a new shard is started.
+    :param metadata: Additional entries to save in the index.
+    :return: Index of the shards, as saved in index.json.
+    """
+    _require_numpy()
+    os.makedirs(out_dir, exist_ok=True)
+    # the shards being overwritten are no longer valid, until the new index is written at the end.
+    if os.path.exists(os.path.join(out_dir, INDEX_FILE)):
+        os.remove(os.path.join(out_dir, INDEX_FILE))
+    dtype = _token_dtype(vocab_size)
+    index = {"dtype": dtype, "vocab_size": vocab_size, **metadata, "shards": []}
+
+    shard = None
+    def close_shard():
+        (fh, name, offsets) = shard
+        fh.close()
+        np.asarray(offsets, dtype="uint64").tofile(os.path.join(out_dir, name + ".idx"))
+        index["shards"].append({"name": name, "documents": len(offsets) - 1, "tokens": offsets[-1]})
+        logger.info(f"wrote {name} with {len(offsets) - 1} documents, {offsets[-1]} tokens")
+
+    for ids in sequences:
+        if shard is None:
+            name = f"shard-{len(index['shards']):05d}"
+            shard = (open(os.path.join(out_dir, name + ".bin"), "wb"), name, [0])
+        np.asarray(ids, dtype=dtype).tofile(shard[0])
+        shard[2].append(shard[2][-1] + len(ids))
+        if shard[2][-1] >= shard_tokens:
+            close_shard()
+            shard = None
+    if shard is not None:
+        close_shard()
+
+    with open(os.path.join(out_dir, INDEX_FILE), "w") as fw:
+        json.dump(index, fw, indent=2)
+        fw.close()
+    return index
+
+def write_token_shards(tokenizer, texts, out_dir:str, lang="ta", batch_size:int=1000, shard_tokens:int=64*1024*1024,
+                       **source) -> dict:
+    """
+    Tokenize the documents once and write their token ids into the token shards (see write_id_shards).
+    :param tokenizer: IndicBertWordPieceTokenizer to encode the documents with.
+    :param texts: Iterable of the documents.
+    :param out_dir: Directory to write the shards and their index.json into.
+    :param lang: Language of the documents, or "auto" for mixed scripts (default is Tamil).
+    :param batch_size: Number of documents to encode at a time.
+    :param shard_tokens: Number of tokens after which a new shard is started.
+    :param source: Entries describing where the documents come from (e.g. dataset, split, samples), saved in the index
+                   to be checked by TokenShardDataset.matches.
+    :return: Index of the shards, as saved in index.json.
+    """
+    def encode():
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= batch_size:
+                yield from (encoding.ids for encoding in tokenizer.encode_batch(batch, lang=lang))
+                batch = []
+        if batch:
+            yield from (encoding.ids for encoding in tokenizer.encode_batch(batch, lang=lang))
+
+    return write_encoded_shards(tokenizer, encode(), out_dir, lang=lang, shard_tokens=shard_tokens, **source)
+
+def write_encoded_shards(tokenizer, sequences, out_dir:str, lang="ta", shard_tokens:int=64*1024*1024, **source) -> dict:
+    """
+    Write the token ids the documents were already encoded into by the tokenizer (e.g. on all the cores,
+    with tokenize_dataset) into the token shards, with the same index as write_token_shards.
+    :param tokenizer: IndicBertWordPieceTokenizer the documents were encoded with.
+    :param sequences: Iterable of the token id sequences of the documents.
+    :param out_dir: Directory to write the shards and their index.json into.
+    :param lang: Language the documents were encoded in, or "auto" for mixed scripts (default is Tamil).
+    :param shard_tokens: Number of tokens after which a new shard is started.
+    :param source: Entries describing where the documents come from, as for write_token_shards.
+    :return: Index of the shards, as saved in index.json.
+    """
+    return write_id_shards(sequences, out_dir, tokenizer._tokenizer.get_vocab_size(), shard_tokens=shard_tokens,
+                           lang=lang, table_hash=tokenizer._mapper.table_hash, fingerprint=tokenizer.fingerprint(lang), **source)
+
+class TokenShardDataset:
+    """
+    The documents of the token shards, read through numpy.memmap.
+    The items are read-only views into the mapped shards, so nothing is copied or loaded up front,
+    and the memory in use does not grow with the size of the corpus.
+    """
+    def __init__(self, path:str, key:str=None):
+        """
+        :param path: Directory of the shards, as written by write_token_shards.
+        :param key: Name to return the token ids of an item under, e.g. "input_ids" for the HuggingFace Trainer,
+                    None to return the ids as they are.
+        """
+        _require_numpy()
+        with open(os.path.join(path, INDEX_FILE), "r") as fh:
+            self.index = json.load(fh)
+            fh.close()
+        self.key = key
+        self.__tokens = []
+        self.__offsets = []
+        for shard in self.index["shards"]:
+            name = os.path.join(path, shard["name"])
+            # an empty file cannot be memory mapped.
+            if shard["tokens"] > 0:
+                self.__tokens.append(np.memmap(name + ".bin", dtype=self.index["dtype"], mode="r"))
+            else:
+                self.__tokens.append(np.empty(0, dtype=self.index["dtype"]))
+            self.__offsets.append(np.memmap(name + ".idx", dtype="uint64", mode="r"))
+        # the index of the first document of each shard, and the total at the end.
+        self.__starts = np.cumsum([0] + [shard["documents"] for shard in self.index["shards"]])
+
+    def __len__(self) -> int:
+        return int(self.__starts[-1])
+
+    def __getitem__(self, item:int):
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(f"document {item} out of range")
+        shard = int(np.searchsorted(self.__starts, item, side="right")) - 1
+        offsets = self.__offsets[shard]
+        local = item - int(self.__starts[shard])
+        ids = self.__tokens[shard][int(offsets[local]):int(offsets[local + 1])]
+        return ids if self.key is None else {self.key: ids}
+
+    def matches(self, tokenizer, **source) -> bool:
+        """
+        Check if the shards were written with the same tokenizer (see IndicBertWordPieceTokenizer.fingerprint),
+        and from the same documents, by the source entries given to write_token_shards (e.g. dataset, split, samples).
+        """
+        if "lang" not in self.index or self.index.get("fingerprint") != tokenizer.fingerprint(self.index["lang"]):
+            return False
+        return all(key in self.index and self.index[key] == value for key, value in source.items())
+
+    def lengths(self):
+        """
+        Get the number of tokens of each document, as an array.
+        """
+        return np.concatenate([np.diff(offsets) for offsets in self.__offsets]) if self.__offsets else np.empty(0, dtype="uint64")
+
+    @property
+    def num_tokens(self) -> int:
+        return sum(shard["tokens"] for shard in self.index["shards"])
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+tokenizer_evaluation.py
+Evaluate saved IndicBertWordPieceTokenizer vocabularies on a held-out corpus, by the sequence lengths they produce:
+the tokens per word and characters per token of each script, the [unk] rate, the distribution of the sequence
+lengths and the encode throughput on this machine. The corpus is streamed in batches of lines, evaluated
+in parallel by worker processes, and the report is JSON, so that the vocabularies can be compared.
+
+The words are the whitespace separated words of the text, with the punctuations attached to them, and the
+script of a word is the one of its first letter. The sequence lengths count the [cls] and [sep] tokens.
+"""
+
+import argparse
+import bisect
+import json
+import multiprocessing
+import os
+import sys
+import time
+from functools import partial
+from itertools import islice
+from .indic_bert_tokenizer import IndicBertWordPieceTokenizer, _whitespace, _imap_bounded
+
+# the scripts the words are reported by, with their unicode ranges.
+SCRIPTS = {"tamil": ((0x0B80, 0x0BFF),), "malayalam": ((0x0D00, 0x0D7F),),
+           "latin": ((0x41, 0x5A), (0x61, 0x7A), (0xC0, 0x24F))}
+
+# the percentiles of the sequence lengths reported.
+PERCENTILES = (50, 90, 95, 99)
+
+# the script of a word, by its first letter ("other" for the words without any letter of the scripts).
+def _script_of(word:str) -> str:
+    for c in word:
+        cp = ord(c)
+        for script, ranges in SCRIPTS.items():
+            if any(low <= cp <= high for (low, high) in ranges):
+                return script
+    return "other"
+
+# the tokenizer of the worker processes, loaded once per worker.
+_worker_tokenizer = None
+
+def _init_worker(model_path:str, mapping_path:str=None):
+    global _worker_tokenizer
+    _worker_tokenizer = IndicBertWordPieceTokenizer(model_path, mapping_path=mapping_path)
+
+# evaluate a batch of lines, returning its counts to be merged.
+def _evaluate_batch(lines:list[str], lang:str="ta", tokenizer:IndicBertWordPieceTokenizer=None) -> dict:
+    tokenizer = tokenizer if tokenizer is not None else _worker_tokenizer
+    unk_id = tokenizer._tokenizer.token_to_id("[unk]")
+
+    # the same steps as encode_batch, keeping the mapped texts to align the tokens with the words.
+    start = time.perf_counter()
+    mapped = [tokenizer._mapper.encode(line, lang=lang) for line in lines]
+    encodings = tokenizer._tokenizer.encode_batch(mapped)
+    seconds = time.perf_counter() - start
+
+    scripts = {}
+    lengths = []
+    for line, text, encoding in zip(lines, mapped, encodings):
+        lengths.append(len(encoding.ids))
+        # the mapper leaves the whitespace alone, so the words of the mapped text are the ones of the line.
+        words = [word for word in _whitespace.split(line) if word]
+        # a token is in the word after the last whitespace before it, less the one the text may start with.
+        starts = [match.start() for match in _whitespace.finditer(text)]
+        leading = 1 if _whitespace.match(text) else 0
+        tokens = [0] * len(words)
+        unks = [0] * len(words)
+        for token_id, (begin, end), special in zip(encoding.ids, encoding.offsets, encoding.special_tokens_mask):
+            if special:
+                continue
+            index = bisect.bisect_right(starts, begin) - leading
+            tokens[index] += 1
+            unks[index] += token_id == unk_id
+        for word, count, unk in zip(words, tokens, unks):
+            stats = scripts.setdefault(_script_of(word), {"words": 0, "chars": 0, "tokens": 0, "unk": 0})
+            stats["words"] += 1
+            stats["chars"] += len(word)
+            stats["tokens"] += count
+            stats["unk"] += unk
+    return {"lines": len(lines), "chars": sum(map(len, lines)), "seconds": seconds, "scripts": scripts, "lengths": lengths}
+
+# read the non-empty lines of the files, in batches.
+def _read_batches(files:list[str], batch_lines:int):
+    def lines():
+        for file in files:
+            with open(file, "r") as fh:
+                for line in fh:
+                    line = line.rstrip("\n")
+                    if line.strip():
+                        yield line
+    iterator = lines()
+    while batch := list(islice(iterator, batch_lines)):
+        yield batch
+
+# the ratio, or None when there is nothing to divide by.
+def _ratio(numerator:float, denominator:float):
+    return numerator / denominator if denominator else None
+
+def _length_distribution(lengths:list[int]) -> dict:
+    if not lengths:
+        return {"count": 0}
+    lengths = sorted(lengths)
+    distribution = {"count": len(lengths), "mean": sum(lengths) / len(lengths), "min": lengths[0], "max": lengths[-1]}
+    for percentile in PERCENTILES:
+        distribution[f"p{percentile}"] = lengths[min(len(lengths) - 1, len(lengths) * percentile // 100)]
+    # the number of the sequences up to each power of two.
+    histogram = {}
+    bound = 8
+    index = 0
+    while index < len(lengths):
+        end = bisect.bisect_right(lengths, bound)
+        histogram[f"<={bound}"] = end - index
+        (index, bound) = (end, bound * 2)
+    distribution["histogram"] = histogram
+    return distribution
+
+def evaluate(model_path:str, files:list[str], lang:str="ta", num_workers:int=None, batch_lines:int=1000,
+             mapping_path:str=None) -> dict:
+    """
+    Evaluate a saved vocabulary on the corpus files, a line per document.
+    :param model_path: Path of the vocabulary file.
+    :param files: List of the text files of the held-out corpus.
+    :param lang: Language of the text, or "auto" for mixed scripts (default is Tamil).
+    :param num_workers: Number of worker processes (default is the number of cores).
+    :param batch_lines: Number of lines evaluated at a time by a worker.
+    :param mapping_path: Optional binary mapping table of the vocabulary.
+    :return: Dictionary of the report.
+    """
+    num_workers = num_workers if num_workers is not None else os.cpu_count()
+    tokenizer = IndicBertWordPieceTokenizer(model_path, mapping_path=mapping_path)
+    totals = {"lines": 0, "chars": 0, "seconds": 0.0, "scripts": {}}
+    lengths = []
+
+    start = time.perf_counter()
+    batches = _read_batches(files, batch_lines)
+    if num_workers > 1:
+        # the tokenizer threads would only compete with the worker processes.
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        with multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(model_path, mapping_path)) as pool:
+            for result in _imap_bounded(pool, partial(_evaluate_batch, lang=lang), batches, window=2 * num_workers):
+                totals, lengths = _merge(totals, lengths, result)
+    else:
+        for batch in batches:
+            totals, lengths = _merge(totals, lengths, _evaluate_batch(batch, lang, tokenizer))
+    wall = time.perf_counter() - start
+
+    scripts = {}
+    for script, stats in sorted(totals["scripts"].items()):
+        scripts[script] = {**stats, "tokens_per_word": _ratio(stats["tokens"], stats["words"]),
+                           "chars_per_token": _ratio(stats["chars"], stats["tokens"]), "unk_rate": _ratio(stats["unk"], stats["tokens"])}
+    words = sum(stats["words"] for stats in scripts.values())
+    tokens = sum(stats["tokens"] for stats in scripts.values())
+    unk = sum(stats["unk"] for stats in scripts.values())
+    return {
+        "model": model_path,
+        "vocab_size": tokenizer._tokenizer.get_vocab_size(),
+        "fingerprint": tokenizer.fingerprint(lang),
+        "lang": lang,
+        "lines": totals["lines"],
+        "words": words,
+        "chars": totals["chars"],
+        "tokens": tokens,
+        "tokens_per_word": _ratio(tokens, words),
+        "chars_per_token": _ratio(totals["chars"], tokens),
+        "unk_rate": _ratio(unk, tokens),
+        "scripts": scripts,
+        "sequence_length": _length_distribution(lengths),
+        "throughput": {
+            "workers": num_workers,
+            "wall_seconds": wall,
+            "chars_per_second": _ratio(totals["chars"], wall),
+            "tokens_per_second": _ratio(tokens, wall),
+            "lines_per_second": _ratio(totals["lines"], wall),
+            # the encoding alone, on a single core.
+            "encode_chars_per_second_per_worker": _ratio(totals["chars"], totals["seconds"]),
+        },
+    }
+
+# add the counts of a batch to the totals.
+def _merge(totals:dict, lengths:list[int], result:dict) -> tuple[dict, list[int]]:
+    for key in ("lines", "chars", "seconds"):
+        totals[key] += result[key]
+    for script, stats in result["scripts"].items():
+        total = totals["scripts"].setdefault(script, {"words": 0, "chars": 0, "tokens": 0, "unk": 0})
+        for key, value in stats.items():
+            total[key] += value
+    lengths.extend(result["lengths"])
+    return totals, lengths
+
+def main(argv:list[str]=None):
+    parser = argparse.ArgumentParser(description="Evaluate Indic BERT tokenizer vocabularies on a held-out corpus")
+    parser.add_argument("files", nargs="+", help="text files of the held-out corpus, a document per line")
+    parser.add_argument("--model", type=str, action="append", required=True,
+                        help="path to a tokenizer vocab file, repeat to compare several")
+    parser.add_argument("--lang", type=str, default="ta", help="language of the text, or auto for mixed scripts")
+    parser.add_argument("--num-workers", type=int, default=None, help="number of worker processes (default is the number of cores)")
+    parser.add_argument("--batch-lines", type=int, default=1000, help="number of lines evaluated at a time by a worker")
+    parser.add_argument("--output", type=str, default=None, help="file to write the JSON report to (default is stdout)")
+    args = parser.parse_args(argv)
+
+    report = {"files": args.files, "models": [evaluate(model, args.files, args.lang, args.num_workers, args.batch_lines)
+                                              for model in args.model]}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return
+    with open(args.output, "w") as fw:
+        json.dump(report, fw, indent=2, ensure_ascii=False)
+        fw.close()
+
+if __name__ == "__main__":
+    main()
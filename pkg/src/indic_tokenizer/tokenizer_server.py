@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+tokenizer_server.py
+A local asyncio tokenization service holding one loaded IndicBertWordPieceTokenizer.
+The concurrent encode/decode requests are collected into micro-batches, bounded by size and wait time,
+and run through the batched path of the tokenizer.
+
+Two transports are served, localhost HTTP and a Unix socket:
+  HTTP:  POST /encode {"text": ..., "lang": "ta"} or {"texts": [...]}, POST /decode {"ids": [...]} or {"sequences": [[...]]},
+         GET /metrics for the Prometheus text metrics (with the per-stage ones of the tokenizer, if instrumented). With ?format=binary the ids are returned in the binary framing.
+  Unix:  one JSON request per line with an "op" of encode, decode or metrics, answered in order with one JSON line,
+         or with a binary frame when the request has "format": "binary".
+
+The binary framing of the ids is a little endian uint32 count of the sequences, followed by each sequence as
+its uint32 length and uint32 ids. On the Unix socket, every binary response is prefixed with a uint8 status
+(0 ids, 1 JSON error) and the uint32 length of the payload.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import struct
+import time
+from urllib.parse import urlsplit, parse_qs
+from .indic_bert_tokenizer import IndicBertWordPieceTokenizer
+from .instrumentation import Histogram, instrumentation
+from .logger import get_logger
+
+logger = get_logger("tokenizer_server")
+
+# the frame header of the binary responses on the unix socket.
+_frame = struct.Struct("<BI")
+
+# pack the token id sequences in the binary framing.
+def _pack_ids(sequences:list[list[int]]) -> bytes:
+    payload = [struct.pack("<I", len(sequences))]
+    for ids in sequences:
+        payload.append(struct.pack(f"<I{len(ids)}I", len(ids), *ids))
+    return b"".join(payload)
+
+class MicroBatcher:
+    """
+    Collect the incoming requests into micro-batches and run them through the batched tokenizer.
+    A batch is closed when it holds max_batch items, or max_wait seconds after its first item arrived.
+    The batches run one at a time in a worker thread, so the event loop keeps accepting the requests meanwhile.
+    """
+    def __init__(self, tokenizer:IndicBertWordPieceTokenizer, max_batch:int=64, max_wait:float=0.002):
+        if max_batch <= 0:
+            raise ValueError(f"max_batch should be positive, got {max_batch=}")
+        if max_wait < 0:
+            raise ValueError(f"max_wait should not be negative, got {max_wait=}")
+        self.tokenizer = tokenizer
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = asyncio.Queue()
+        self._task = None
+        # powers of two up to the batch size, and the latencies from 100us to 10s.
+        self._batch_sizes = Histogram([2 ** i for i in range(max_batch.bit_length())] + ([max_batch] if max_batch & (max_batch - 1) else []))
+        self._queue_depths = Histogram([0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024])
+        self._latencies = Histogram([0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10])
+        self._requests = 0
+        self._errors = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.__run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def encode(self, text:str, lang:str="ta") -> dict:
+        """
+        Encode a text in the next micro-batch.
+        :return: Dictionary of the token ids and the tokens, in the original script.
+        """
+        if not isinstance(text, str):
+            raise ValueError("the text to encode should be a string")
+        if not isinstance(lang, str):
+            raise ValueError("the language should be a string")
+        return await self.__submit("encode", lang, text)
+
+    async def decode(self, ids:list[int], skip_special_tokens:bool=True) -> str:
+        """
+        Decode a token id sequence in the next micro-batch.
+        """
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            raise ValueError("the ids to decode should be a list of integers")
+        return await self.__submit("decode", bool(skip_special_tokens), ids)
+
+    async def __submit(self, op:str, key, payload):
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((op, key, payload, future, time.perf_counter()))
+        return await future
+
+    async def __run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self._queue_depths.observe(self._queue.qsize())
+            self._batch_sizes.observe(len(batch))
+            try:
+                results = await loop.run_in_executor(None, self.__process, batch)
+            except Exception as e:
+                # fail the requests of this batch only, the loop has to keep serving the others.
+                results = [e if isinstance(e, ValueError) else ValueError(str(e))] * len(batch)
+            now = time.perf_counter()
+            for (_, _, _, future, start), result in zip(batch, results):
+                self._requests += 1
+                self._latencies.observe(now - start)
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    self._errors += 1
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    # run a batch through the tokenizer, a group of requests per operation and key,
+    # returning the result (or the exception) of each request.
+    def __process(self, batch:list) -> list:
+        groups = {}
+        for index, (op, key, payload, _, _) in enumerate(batch):
+            groups.setdefault((op, key), []).append(index)
+
+        results = [None] * len(batch)
+        for (op, key), indices in groups.items():
+            payloads = [batch[i][2] for i in indices]
+            try:
+                if op == "encode":
+                    encodings = self.tokenizer.encode_batch(payloads, lang=key)
+                    outputs = [{"ids": encoding.ids, "tokens": [self.tokenizer.decode_string(token) for token in encoding.tokens]}
+                               for encoding in encodings]
+                else:
+                    outputs = self.tokenizer.decode_batch(payloads, skip_special_tokens=key)
+            except Exception as e:
+                # the tokenizer rejects the malformed inputs of a group with its own exception types.
+                outputs = [e if isinstance(e, ValueError) else ValueError(str(e))] * len(indices)
+            for i, output in zip(indices, outputs):
+                results[i] = output
+        return results
+
+    def metrics(self) -> str:
+        """
+        Get the metrics in the Prometheus text format.
+        """
+        lines = ["# TYPE indic_tokenizer_queue_depth gauge",
+                 f"indic_tokenizer_queue_depth {self._queue.qsize()}",
+                 "# TYPE indic_tokenizer_requests_total counter",
+                 f"indic_tokenizer_requests_total {self._requests}",
+                 "# TYPE indic_tokenizer_errors_total counter",
+                 f"indic_tokenizer_errors_total {self._errors}",
+                 "# TYPE indic_tokenizer_batch_size histogram"]
+        lines += self._batch_sizes.render("indic_tokenizer_batch_size")
+        lines.append("# TYPE indic_tokenizer_queue_depth_at_batch histogram")
+        lines += self._queue_depths.render("indic_tokenizer_queue_depth_at_batch")
+        lines.append("# TYPE indic_tokenizer_request_latency_seconds histogram")
+        lines += self._latencies.render("indic_tokenizer_request_latency_seconds")
+        return "\n".join(lines) + "\n" + (instrumentation.prometheus() if instrumentation.enabled else "")
+
+class TokenizerServer:
+    """
+    Serve a micro-batched tokenizer over localhost HTTP and/or a Unix socket.
+    """
+    def __init__(self, batcher:MicroBatcher):
+        self.batcher = batcher
+        self._servers = []
+
+    # run a JSON request, returning the list of the id sequences for the binary framing,
+    # or the object to send back as JSON.
+    async def __handle(self, op:str, request:dict, binary:bool=False):
+        if op == "encode":
+            lang = request.get("lang", "ta")
+            if "texts" in request:
+                outputs = await asyncio.gather(*(self.batcher.encode(text, lang) for text in request["texts"]))
+                return [output["ids"] for output in outputs] if binary else outputs
+            output = await self.batcher.encode(request.get("text"), lang)
+            return [output["ids"]] if binary else output
+        if op == "decode":
+            skip = request.get("skip_special_tokens", True)
+            if "sequences" in request:
+                return {"texts": await asyncio.gather(*(self.batcher.decode(ids, skip) for ids in request["sequences"]))}
+            return {"text": await self.batcher.decode(request.get("ids"), skip)}
+        raise ValueError(f"unknown operation {op=}")
+
+    async def __serve_http(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                (method, target, version) = line.decode("latin-1").split()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                url = urlsplit(target)
+                binary = parse_qs(url.query).get("format", ["json"])[0] == "binary"
+
+                content_type = "application/json"
+                try:
+                    if method == "GET" and url.path == "/metrics":
+                        (status, content_type, payload) = (200, "text/plain; version=0.0.4", self.batcher.metrics().encode("utf-8"))
+                    elif method == "POST" and url.path in ("/encode", "/decode"):
+                        result = await self.__handle(url.path[1:], json.loads(body or b"{}"), binary)
+                        if binary and url.path == "/encode":
+                            (status, content_type, payload) = (200, "application/octet-stream", _pack_ids(result))
+                        else:
+                            (status, payload) = (200, json.dumps(result, ensure_ascii=False).encode("utf-8"))
+                    else:
+                        (status, payload) = (404, json.dumps({"error": f"no route for {method} {url.path}"}).encode("utf-8"))
+                except (ValueError, TypeError, KeyError, AttributeError) as e:
+                    (status, payload) = (400, json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8"))
+
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                reason = {200: "OK", 400: "Bad Request", 404: "Not Found"}[status]
+                writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n"
+                             f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode("latin-1") + payload)
+                await writer.drain()
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # a malformed request line or a dropped connection ends the connection.
+            pass
+        finally:
+            writer.close()
+
+    # answer a JSON line request on the unix socket.
+    async def __answer(self, line:bytes) -> bytes:
+        binary = False
+        try:
+            request = json.loads(line)
+            binary = request.get("format") == "binary"
+            op = request.get("op", "encode")
+            if op == "metrics":
+                result = {"metrics": self.batcher.metrics()}
+            else:
+                result = await self.__handle(op, request, binary and op == "encode")
+            if binary and op == "encode":
+                payload = _pack_ids(result)
+                return _frame.pack(0, len(payload)) + payload
+            payload = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            payload = json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8")
+            if binary:
+                return _frame.pack(1, len(payload)) + payload
+        return payload + b"\n"
+
+    async def __serve_unix(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        # the requests of a connection are answered concurrently, so that they can share the batches,
+        # but the responses are written back in the order of the requests.
+        pending = asyncio.Queue()
+
+        async def respond():
+            while (task := await pending.get()) is not None:
+                writer.write(await task)
+                await writer.drain()
+
+        responder = asyncio.get_running_loop().create_task(respond())
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    pending.put_nowait(asyncio.ensure_future(self.__answer(line)))
+            pending.put_nowait(None)
+            await responder
+        except ConnectionError:
+            responder.cancel()
+        finally:
+            writer.close()
+
+    async def start(self, host:str=None, port:int=None, unix_path:str=None):
+        """
+        Start serving HTTP on host:port and/or JSON lines on the Unix socket path.
+        """
+        if port is None and unix_path is None:
+            raise ValueError("either a port or a unix socket path is required")
+        self.batcher.start()
+        if port is not None:
+            self._servers.append(await asyncio.start_server(self.__serve_http, host or "127.0.0.1", port))
+            logger.info(f"serving http on {host or '127.0.0.1'}:{port}")
+        if unix_path is not None:
+            if os.path.exists(unix_path):
+                os.unlink(unix_path)
+            self._servers.append(await asyncio.start_unix_server(self.__serve_unix, unix_path))
+            logger.info(f"serving unix socket on {unix_path}")
+
+    async def serve_forever(self):
+        await asyncio.gather(*(server.serve_forever() for server in self._servers))
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        await self.batcher.stop()
+
+def main(argv:list[str]=None):
+    parser = argparse.ArgumentParser(description="Serve an Indic BERT tokenizer with micro-batching")
+    parser.add_argument("--model", type=str, required=True, help="path to the tokenizer vocab file")
+    parser.add_argument("--mapping", type=str, default=None, help="path to the mapping table of the model")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="host to serve http on")
+    parser.add_argument("--port", type=int, default=None, help="port to serve http on")
+    parser.add_argument("--unix", type=str, default=None, help="unix socket path to serve on")
+    parser.add_argument("--max-batch", type=int, default=64, help="maximum number of requests in a batch")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="maximum wait for a batch to fill, in milliseconds")
+    parser.add_argument("--instrument", action="store_true", help="add the per-stage timings of the tokenizer to the metrics")
+    args = parser.parse_args(argv)
+    if args.port is None and args.unix is None:
+        parser.error("either --port or --unix is required")
+    if args.instrument:
+        instrumentation.enable()
+
+    tokenizer = IndicBertWordPieceTokenizer(args.model, mapping_path=args.mapping)
+
+    async def run():
+        server = TokenizerServer(MicroBatcher(tokenizer, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000))
+        await server.start(args.host, args.port, args.unix)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+# ensure the package is installed.
+# pip install -i https://test.pypi.org/simple/ indic-tokenizer -U
+
+# checks that the vocabularies of a sweep keep the alphabet a direct build of the same size keeps.
+# usage: indic-bert-tokenizer-sweep-tester.py <corpus-file> <size>[,<size>...]
+
+import os
+import sys
+import tempfile
+
+if len(sys.argv) < 3:
+    print("requires <corpus-file> <sizes>")
+    sys.exit(0)
+
+from indic_tokenizer import IndicBertWordPieceTokenizer
+
+files = [sys.argv[1]]
+sizes = sorted(set(int(size) for size in sys.argv[2].split(",")))
+_vocab = "indic-bert-tokenizer-vocab.txt"
+
+# read the tokens of a saved vocabulary, in the order of their ids.
+def read_vocab(model_dir:str) -> list[str]:
+    with open(os.path.join(model_dir, _vocab), "r") as fin:
+        return fin.read().split("\n")[:-1]
+
+# the special tokens, the characters and their ## continuations.
+def alphabet(tokens:list[str]) -> set[str]:
+    return {token for token in tokens if token.startswith("[") or len(token.removeprefix("##")) == 1}
+
+failed = 0
+with tempfile.TemporaryDirectory() as tmpdir:
+    IndicBertWordPieceTokenizer.build_model(files, model_dir=os.path.join(tmpdir, "sweep"), vocab_size=sizes)
+    for size in sizes:
+        direct_dir = os.path.join(tmpdir, f"direct-{size}")
+        os.makedirs(direct_dir, exist_ok=True)
+        IndicBertWordPieceTokenizer.build_model(files, model_dir=direct_dir, vocab_size=size)
+        direct = read_vocab(direct_dir)
+        swept = read_vocab(os.path.join(tmpdir, "sweep", f"vocab-{size}"))
+        missing = alphabet(direct) - alphabet(swept)
+        extra = alphabet(swept) - alphabet(direct)
+        # the merges may differ among the ties of equal counts, the alphabet may not.
+        print(f"size {size}: direct {len(direct)} tokens, sweep {len(swept)} tokens, "
+              f"{len(set(direct) & set(swept))} shared, alphabet missing {len(missing)} extra {len(extra)}")
+        if missing or extra or len(direct) != len(swept):
+            print(f"  missing: {sorted(missing)[:20]}\n  extra: {sorted(extra)[:20]}")
+            failed += 1
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+# ensure the package is installed.
+# pip install -i https://test.pypi.org/simple/ indic-tokenizer -U
+
+# checks that encode, encode_with_alignment and encode_bytes give the output of encode_reference
+# on every letter, the replacement strings and the stray viramas, in each language and in "auto".
+# usage: indic-unicode-mapper-equivalence-tester.py
+
+import sys
+
+from indic_tokenizer import IndicUnicodeMapper
+
+mapper = IndicUnicodeMapper()
+languages = ["ta", "ml"]
+viramas = ["்", "്"]
+
+# the replacement strings are the rules ahead of the first grapheme, which the reverse table holds.
+def replacements(lang:str) -> list[str]:
+    reverse = dict(mapper.decode_rules())
+    rules = mapper.encode_rules(lang)
+    first = next(index for index, (_, content) in enumerate(rules) if content in reverse)
+    return [pattern for (pattern, _) in rules[:first]]
+
+# the texts to compare on: each letter on its own, within a word and in a run of letters,
+# the replacement strings in and out of the words, and the viramas on their own, doubled and after each letter.
+def cases() -> list[str]:
+    letters = [letter for lang in languages for letter in mapper.letters(lang)]
+    texts = []
+    for letter in letters:
+        texts += [letter, f" {letter} ", f"x{letter}y", letter + letter]
+        texts += [letter + virama for virama in viramas]
+    texts.append("".join(letters))
+    for pattern in {pattern for lang in languages + ["auto"] for pattern in replacements(lang)}:
+        texts += [pattern, f" {pattern} ", f"க{pattern}", f"ക{pattern}", pattern + pattern]
+    for virama in viramas:
+        texts += [virama, virama + virama, f" {virama} ", f"{virama}க", f"{virama}ക", f"a{virama}b"]
+    return texts
+
+failed = 0
+texts = cases()
+for lang in languages + ["auto"]:
+    mismatches = 0
+    for text in texts:
+        expected = mapper.encode_reference(text, lang=lang)
+        mapped, alignment = mapper.encode_with_alignment(text, lang=lang)
+        outputs = {"encode": mapper.encode(text, lang=lang), "encode_with_alignment": mapped,
+                   "encode_bytes": mapper.encode_bytes(text.encode("utf-8"), lang=lang).decode("utf-8")}
+        wrong = [name for name, output in outputs.items() if output != expected]
+        # the alignment has an entry for each mapped character, and a trailing one for the length of the text.
+        if len(alignment) != len(mapped) + 1 or alignment[-1] != len(text) or alignment != sorted(alignment):
+            wrong.append("alignment")
+        if wrong:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"  {lang} {text!r}: {', '.join(wrong)} differ from encode_reference")
+    print(f"lang {lang}: {len(texts)} texts, {mismatches} mismatches")
+    failed += mismatches
+
+sys.exit(1 if failed else 0)
@@ -1,4 +1,5 @@
 import argparse
+import os
 from datasets import load_dataset
 from transformers import (
     GPT2LMHeadModel,
@@ -8,7 +9,8 @@ from transformers import (
     PreTrainedTokenizerFast,
 )
 from indic_bert_tokenizer import IndicBertWordPieceTokenizer
-from indic_unicode_mapper import IndicUnicodeMapper
+from preprocess import tokenize_dataset
+from token_shards import INDEX_FILE, TokenShardDataset, write_encoded_shards
 
 
 def main():
@@ -23,10 +25,19 @@ def main():
         required=True,
         help="path to Indic tokenizer vocab file",
     )
+    parser.add_argument(
+        "--token_shards",
+        type=str,
+        default=None,
+        help="directory of the pre-tokenized token shards, written on the first run and trained from afterwards",
+    )
+    parser.add_argument("--num_proc", type=int, default=None, help="number of processes to tokenize with (default: all the cores)")
+    parser.add_argument("--cache_dir", type=str, default="tokenized-cache", help="where to cache the tokenized dataset")
     args = parser.parse_args()
 
-    dataset = load_dataset(args.dataset_name, split=f"train[:{args.samples}]")
     indic_tok = IndicBertWordPieceTokenizer(args.tokenizer_path)
+    # the text is mapped by the Python mapper, here and in app.py, so the plain base tokenizer is saved along with
+    # the model. the one of to_tokenizer embeds the mapping, but runs about 1.6 times slower per core.
     hf_tokenizer = PreTrainedTokenizerFast(
         tokenizer_object=indic_tok._tokenizer._tokenizer,
         bos_token="[cls]",
@@ -35,13 +46,19 @@ def main():
         pad_token="[pad]",
         mask_token="[mask]",
     )
-    mapper = IndicUnicodeMapper()
-
-    def tokenize_function(examples):
-        mapped = [mapper.encode(t) for t in examples["text"]]
-        return hf_tokenizer(mapped)
 
-    tokenized = dataset.map(tokenize_function, batched=True, remove_columns=dataset.column_names)
+    # the shards are reused only if they were written by the same tokenizer from the same documents.
+    origin = {"dataset": args.dataset_name, "split": f"train[:{args.samples}]", "samples": args.samples}
+    train_dataset = TokenShardDataset(args.token_shards, key="input_ids") if args.token_shards and \
+        os.path.isfile(os.path.join(args.token_shards, INDEX_FILE)) else None
+    if train_dataset is None or not train_dataset.matches(indic_tok, **origin):
+        dataset = load_dataset(args.dataset_name, split=origin["split"])
+        train_dataset = tokenize_dataset(dataset, indic_tok, lang="ta", num_proc=args.num_proc, cache_dir=args.cache_dir)
+        if args.token_shards:
+            # tokenized on all the cores, and kept as the shards the later runs train straight from.
+            write_encoded_shards(indic_tok, (example["input_ids"] for example in train_dataset), args.token_shards,
+                                 lang="ta", **origin)
+            train_dataset = TokenShardDataset(args.token_shards, key="input_ids")
 
     model = GPT2LMHeadModel.from_pretrained(args.model_dir)
     data_collator = DataCollatorForLanguageModeling(tokenizer=hf_tokenizer, mlm=False)
@@ -56,7 +73,7 @@ def main():
     trainer = Trainer(
         model=model,
         args=training_args,
-        train_dataset=tokenized,
+        train_dataset=train_dataset,
         data_collator=data_collator,
     )
     trainer.train()
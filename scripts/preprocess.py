@@ -0,0 +1,140 @@
+import hashlib
+import os
+import shutil
+import numpy as np
+from datasets import load_from_disk
+from token_shards import INDEX_FILE, TokenShardDataset, write_id_shards
+
+
+def _encode_batch(examples, tokenizer, lang):
+    encodings = tokenizer.encode_batch(examples["text"], lang=lang)
+    return {
+        "input_ids": [encoding.ids for encoding in encodings],
+        "attention_mask": [encoding.attention_mask for encoding in encodings],
+    }
+
+
+def tokenize_dataset(dataset, indic_tok, lang="ta", num_proc=None, cache_dir="tokenized-cache"):
+    """
+    Tokenize the text column of the dataset on all the cores, with the batched mapper/tokenizer path.
+    The result is saved under a key of the dataset and the tokenizer fingerprint (vocabulary, mapping table
+    and normalization rules), so a changed tokenizer gets tokenized afresh and an unchanged one loads from disk.
+    """
+    key = hashlib.sha256(f"{dataset._fingerprint}:{indic_tok.fingerprint(lang)}:{lang}".encode("utf-8")).hexdigest()[:32]
+    path = os.path.join(cache_dir, key)
+    if os.path.isdir(path):
+        print(f"loading the tokenized dataset from {path}")
+        return load_from_disk(path)
+
+    # each worker process tokenizes on its own core.
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    tokenized = dataset.map(
+        _encode_batch,
+        batched=True,
+        num_proc=num_proc or os.cpu_count(),
+        remove_columns=dataset.column_names,
+        fn_kwargs={"tokenizer": indic_tok, "lang": lang},
+        new_fingerprint=key,
+    )
+    # save into a temporary directory first, so that an interrupted run leaves no partial cache behind.
+    shutil.rmtree(path + ".tmp", ignore_errors=True)
+    tokenized.save_to_disk(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return load_from_disk(path)
+
+
+def pack_sequences(sequences, block_size, sep_id, pad_id, mask_aware=False, stats=None):
+    """
+    Pack the tokenized documents into blocks of exactly block_size tokens, streaming.
+    The documents are joined with [sep] and cut at the block boundaries, and the incomplete last block is dropped.
+    With mask_aware, a document is only cut when it is longer than a block: the documents that do not fit
+    into the rest of a block start the next one, and the rest is padded (and masked out by PackedBlocks).
+    The number of the tokens, the padding and the dropped tokens are counted into stats, if given.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(tokens=0, padding=0, dropped=0)
+    block = []
+    for ids in sequences:
+        ids = list(ids)
+        if not ids or ids[-1] != sep_id:
+            ids.append(sep_id)
+        stats["tokens"] += len(ids)
+        if not mask_aware:
+            block.extend(ids)
+            while len(block) >= block_size:
+                yield block[:block_size]
+                del block[:block_size]
+            continue
+        for start in range(0, len(ids), block_size):
+            piece = ids[start:start + block_size]
+            if len(block) + len(piece) > block_size:
+                stats["padding"] += block_size - len(block)
+                yield block + [pad_id] * (block_size - len(block))
+                block = []
+            block.extend(piece)
+    if mask_aware and block:
+        stats["padding"] += block_size - len(block)
+        yield block + [pad_id] * (block_size - len(block))
+    elif block:
+        stats["dropped"] += len(block)
+
+
+def padding_waste(lengths, batch_size, block_size):
+    """
+    Get the share of the padding in the batches the collator builds, padding each batch (in order)
+    to its longest sequence, with the sequences truncated to block_size.
+    """
+    (padded, tokens, batch) = (0, 0, [])
+    for length in lengths:
+        batch.append(min(int(length), block_size))
+        if len(batch) == batch_size:
+            (padded, tokens, batch) = (padded + max(batch) * len(batch), tokens + sum(batch), [])
+    if batch:
+        (padded, tokens) = (padded + max(batch) * len(batch), tokens + sum(batch))
+    return 1 - tokens / padded if padded else 0.0
+
+
+class PackedBlocks:
+    """
+    The packed blocks of the token shards, as the training items.
+    With mask_aware, the padding is masked out of the attention (and of the labels, by the collator). The documents
+    of a block attend to each other and their positions run on through the block, as with the exact packing.
+    """
+
+    def __init__(self, blocks, pad_id, mask_aware=False):
+        self.blocks = blocks
+        self.pad_id = pad_id
+        self.mask_aware = mask_aware
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __getitem__(self, item):
+        ids = np.asarray(self.blocks[item], dtype=np.int64)
+        if not self.mask_aware:
+            return {"input_ids": ids}
+        return {"input_ids": ids, "attention_mask": (ids != self.pad_id).astype(np.int64)}
+
+
+def pack_dataset(sequences, out_dir, indic_tok, block_size, mask_aware=False, source_key=""):
+    """
+    Pack the tokenized documents into the token shards of out_dir (see pack_sequences), or reuse them
+    if they were packed from the same source with the same settings.
+    :return: The PackedBlocks over the shards, and the stats of the packing (None if reused).
+    """
+    sep_id = indic_tok._tokenizer.token_to_id("[sep]")
+    pad_id = indic_tok._tokenizer.token_to_id("[pad]")
+    settings = {"source": source_key, "block_size": block_size, "mask_aware": mask_aware}
+    stats = None
+    if os.path.isfile(os.path.join(out_dir, INDEX_FILE)):
+        blocks = TokenShardDataset(out_dir)
+        if blocks.index.get("packing") != settings:
+            blocks = None
+    else:
+        blocks = None
+    if blocks is None:
+        stats = {}
+        write_id_shards(pack_sequences(sequences, block_size, sep_id, pad_id, mask_aware, stats), out_dir,
+                        indic_tok._tokenizer.get_vocab_size(), packing=settings)
+        blocks = TokenShardDataset(out_dir)
+    return PackedBlocks(blocks, pad_id, mask_aware), stats
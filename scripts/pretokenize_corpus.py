@@ -0,0 +1,33 @@
+import argparse
+from indic_bert_tokenizer import IndicBertWordPieceTokenizer
+from token_shards import write_token_shards
+
+
+def read_documents(files):
+    for file in files:
+        with open(file, "r") as fh:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    yield line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenize text files once into memory-mapped token shards")
+    parser.add_argument("files", nargs="+", help="text files to tokenize, a document per line")
+    parser.add_argument("--tokenizer_path", type=str, required=True, help="path to Indic tokenizer vocab file")
+    parser.add_argument("--output_dir", type=str, required=True, help="where to write the token shards")
+    parser.add_argument("--lang", type=str, default="ta", help="language of the text, or auto for mixed scripts")
+    parser.add_argument("--shard_tokens", type=int, default=64 * 1024 * 1024, help="number of tokens per shard")
+    args = parser.parse_args()
+
+    indic_tok = IndicBertWordPieceTokenizer(args.tokenizer_path)
+    index = write_token_shards(indic_tok, read_documents(args.files), args.output_dir, lang=args.lang,
+                               shard_tokens=args.shard_tokens)
+    documents = sum(shard["documents"] for shard in index["shards"])
+    tokens = sum(shard["tokens"] for shard in index["shards"])
+    print(f"wrote {documents} documents, {tokens} tokens in {len(index['shards'])} shards to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import argparse
+import os
 from datasets import load_dataset
 from transformers import (
     GPT2Config,
@@ -9,7 +10,8 @@ from transformers import (
     PreTrainedTokenizerFast,
 )
 from indic_bert_tokenizer import IndicBertWordPieceTokenizer
-from indic_unicode_mapper import IndicUnicodeMapper
+from preprocess import pack_dataset, padding_waste, tokenize_dataset
+from token_shards import INDEX_FILE, TokenShardDataset, write_encoded_shards
 
 
 def main():
@@ -22,11 +24,27 @@ def main():
         required=True,
         help="path to Indic tokenizer vocab file",
     )
+    parser.add_argument(
+        "--token_shards",
+        type=str,
+        default=None,
+        help="directory of the pre-tokenized token shards, written on the first run and trained from afterwards",
+    )
+    parser.add_argument("--num_proc", type=int, default=None, help="number of processes to tokenize with (default: all the cores)")
+    parser.add_argument("--cache_dir", type=str, default="tokenized-cache", help="where to cache the tokenized dataset")
+    parser.add_argument("--block_size", type=int, default=256, help="context length of the model, and the size of the packed blocks")
+    parser.add_argument(
+        "--packing",
+        choices=["exact", "mask_aware", "none"],
+        default="exact",
+        help="pack the documents into blocks: exact cuts, mask_aware keeps the documents whole and masks the padding",
+    )
     args = parser.parse_args()
-
-    dataset = load_dataset("ai4bharat/IndicCorp", "ta", split=f"train[:{args.samples}]")
+    batch_size = 8
 
     indic_tok = IndicBertWordPieceTokenizer(args.tokenizer_path)
+    # the text is mapped by the Python mapper, here and in app.py, so the plain base tokenizer is saved along with
+    # the model. the one of to_tokenizer embeds the mapping, but runs about 1.6 times slower per core.
     hf_tokenizer = PreTrainedTokenizerFast(
         tokenizer_object=indic_tok._tokenizer._tokenizer,
         bos_token="[cls]",
@@ -35,18 +53,37 @@ def main():
         pad_token="[pad]",
         mask_token="[mask]",
     )
-    mapper = IndicUnicodeMapper()
 
-    def tokenize_function(examples):
-        mapped = [mapper.encode(t) for t in examples["text"]]
-        return hf_tokenizer(mapped)
+    # the shards are reused only if they were written by the same tokenizer from the same documents.
+    origin = {"dataset": "ai4bharat/IndicCorp:ta", "split": f"train[:{args.samples}]", "samples": args.samples}
+    train_dataset = TokenShardDataset(args.token_shards, key="input_ids") if args.token_shards and \
+        os.path.isfile(os.path.join(args.token_shards, INDEX_FILE)) else None
+    if train_dataset is None or not train_dataset.matches(indic_tok, **origin):
+        dataset = load_dataset("ai4bharat/IndicCorp", "ta", split=origin["split"])
+        train_dataset = tokenize_dataset(dataset, indic_tok, lang="ta", num_proc=args.num_proc, cache_dir=args.cache_dir)
+        if args.token_shards:
+            # tokenized on all the cores, and kept as the shards the later runs train straight from.
+            write_encoded_shards(indic_tok, (example["input_ids"] for example in train_dataset), args.token_shards,
+                                 lang="ta", **origin)
+            train_dataset = TokenShardDataset(args.token_shards, key="input_ids")
 
-    tokenized = dataset.map(tokenize_function, batched=True, remove_columns=["text"])
+    # the padding wasted by the collator on the variable length documents, against the packed blocks.
+    waste = padding_waste((len(item["input_ids"]) for item in train_dataset), batch_size, args.block_size)
+    print(f"padding waste without packing: {waste:.1%}")
+    if args.packing != "none":
+        source = train_dataset.index["fingerprint"] if isinstance(train_dataset, TokenShardDataset) else train_dataset._fingerprint
+        train_dataset, stats = pack_dataset((item["input_ids"] for item in train_dataset), os.path.join(args.cache_dir, "packed"),
+                                            indic_tok, args.block_size, mask_aware=args.packing == "mask_aware",
+                                            source_key=f"{source}:{args.samples}")
+        if stats is not None:
+            waste = stats["padding"] / max(stats["tokens"] - stats["dropped"] + stats["padding"], 1)
+            print(f"packed {stats['tokens']} tokens into {len(train_dataset)} blocks of {args.block_size}, "
+                  f"{stats['dropped']} tokens dropped, padding waste: {waste:.1%}")
 
     config = GPT2Config(
         vocab_size=hf_tokenizer.vocab_size,
-        n_positions=256,
-        n_ctx=256,
+        n_positions=args.block_size,
+        n_ctx=args.block_size,
         n_embd=128,
         n_layer=2,
         n_head=2,
@@ -58,7 +95,7 @@ def main():
         output_dir=args.output_dir,
         overwrite_output_dir=True,
         num_train_epochs=1,
-        per_device_train_batch_size=8,
+        per_device_train_batch_size=batch_size,
         save_steps=1000,
         logging_steps=50,
     )
@@ -66,7 +103,7 @@ def main():
     trainer = Trainer(
         model=model,
         args=training_args,
-        train_dataset=tokenized,
+        train_dataset=train_dataset,
         data_collator=data_collator,
     )
     trainer.train()
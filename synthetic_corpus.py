@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+# synthetic Tamil/Malayalam/English corpus of a given size and script mix, built from the mapper letters.
+# usage: synthetic_corpus.py <size-in-MB> [ta=0.5,ml=0.3,en=0.2] [seed] > corpus.txt
+
+import random
+import string
+import sys
+
+from indic_unicode_mapper import IndicUnicodeMapper
+
+# the default share of the lines in each script.
+DEFAULT_MIX = {"ta": 0.5, "ml": 0.3, "en": 0.2}
+
+# parse a script mix like "ta=0.5,ml=0.3,en=0.2".
+def parse_mix(text:str) -> dict:
+    mix = {}
+    for item in text.split(","):
+        (lang, _, share) = item.partition("=")
+        if lang not in DEFAULT_MIX:
+            raise ValueError(f"unknown script {lang=}, expected one of {list(DEFAULT_MIX)}")
+        mix[lang] = float(share)
+    if sum(mix.values()) <= 0:
+        raise ValueError(f"the script mix should have a positive share, got {text=}")
+    return mix
+
+# generate the corpus lines, about size_mb MB of utf-8 in total.
+# each line is in one script, picked by the mix, with words of 1 to 5 letters (graphemes) and punctuations.
+def generate_lines(size_mb:float, mix:dict=None, seed:int=0) -> list[str]:
+    mix = mix if mix is not None else DEFAULT_MIX
+    rng = random.Random(seed)
+    mapper = IndicUnicodeMapper()
+    letters = {lang: mapper.letters(lang) if lang != "en" else list(string.ascii_lowercase) for lang in mix}
+    langs = list(mix.keys())
+    weights = [mix[lang] for lang in langs]
+
+    target = int(size_mb * 1024 * 1024)
+    lines = []
+    size = 0
+    while size < target:
+        lang = rng.choices(langs, weights)[0]
+        words = ["".join(rng.choices(letters[lang], k=rng.randint(1, 5))) for _ in range(rng.randint(4, 16))]
+        line = " ".join(words) + rng.choice((".", ",", "!", "?", " 2025.")) + "\n"
+        lines.append(line)
+        size += len(line.encode("utf-8"))
+    return lines
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("requires <size-in-MB> [mix] [seed]")
+        sys.exit(0)
+    _mix = parse_mix(sys.argv[2]) if len(sys.argv) > 2 else None
+    _seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    sys.stdout.writelines(generate_lines(float(sys.argv[1]), _mix, _seed))